@@ -0,0 +1,37 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from flappybird.vector_flappy import VectorFlappyGame
+from flappybird.flappy_bird import FlappyGame
+
+ticks = 200
+
+
+def flap(obs: np.ndarray) -> np.ndarray:
+    # Jump when falling below the middle of the next gap, which keeps most birds alive for the whole run
+    return (obs[..., 0] > (obs[..., 2] + obs[..., 3]) / 2) & (obs[..., 4] > 0)
+
+
+@benchmark('flappy.update', birds=[1, 100, 1000], items=lambda birds: birds * ticks, unit='bird-ticks')
+def flappy_update(birds):
+    def episode():
+        game = FlappyGame(1080, 720, birds, seed=0)
+        for _ in range(ticks):
+            obs = np.array([bird.read_env() for bird in game.birds])
+            for bird, jump in zip(game.birds, flap(obs)):
+                bird.jumping = jump
+            game.update()
+
+    return episode
+
+
+@benchmark('vector_flappy.update', birds=[1, 100, 1000, 10000], items=lambda birds: birds * ticks,
+           unit='bird-ticks')
+def vector_flappy_update(birds):
+    def episode():
+        game = VectorFlappyGame(1080, 720, birds, seed=0)
+        for _ in range(ticks):
+            game.act(flap(game.read_env())[:, None].astype(float))
+            game.update()
+
+    return episode
@@ -0,0 +1,25 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from network.network import Network, genome_layout, simulate_batch
+
+topologies = [(5, 5, 1), (16, 32, 32, 4), (64, 128, 128, 8)]
+
+
+@benchmark('network.simulate', topology=topologies, items=lambda topology: 1, unit='calls')
+def simulate(topology):
+    network = Network(list(topology))
+    inputs = np.random.default_rng(0).random(topology[0]).tolist()
+    return lambda: network.simulate(inputs)
+
+
+@benchmark('network.simulate_batch', topology=topologies, population=[200, 5000],
+           items=lambda topology, population: population, unit='networks')
+def simulate_batch_(topology, population):
+    rng = np.random.default_rng(0)
+    layout = genome_layout(topology)
+    genomes = layout.random(population, np.float32, rng)
+    weights, biases = layout.weights(genomes), layout.biases(genomes)
+    inputs = rng.random((population, topology[0]), dtype=np.float32)
+    alive = np.ones(population, dtype=bool)
+    return lambda: simulate_batch(weights, biases, inputs, alive)
@@ -0,0 +1,19 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from network.pool import Pool, weighted_selector
+
+populations = [200, 1000, 5000, 20000, 50000]
+
+
+@benchmark('pool.next_generation', population=populations, topology=[(5, 5, 1), (16, 32, 32, 4)],
+           items=lambda population, topology: population, unit='genomes')
+def next_generation(population, topology):
+    pool = Pool(population, list(topology), crossover_selector=weighted_selector, carry_over=10, seed=0)
+    fitnesses = np.random.default_rng(0).random(population)
+
+    def step():
+        pool.fitnesses[:] = fitnesses
+        pool.next_generation()
+
+    return step
@@ -0,0 +1,52 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from raymarching import raymarch
+
+rays = 10000
+
+
+def primitive(name: str) -> raymarch.SDF:
+    if name == 'circle':
+        return raymarch.circle_sdf(200).translate(540, 360)
+    if name == 'line':
+        return raymarch.line_segment_sdf((100, 100), (900, 600)).round(20)
+    if name == 'bezier':
+        return raymarch.bezier_sdf((100, 100), (540, 700), (980, 50)).round(20)
+    if name == 'union':
+        return (raymarch.circle_sdf(100).translate(300, 300) + raymarch.line_segment_sdf((500, 100), (900, 600)) +
+                raymarch.bezier_sdf((100, 600), (540, 200), (980, 650)))
+    if name == 'grid_union':
+        rng = np.random.default_rng(0)
+        starts = rng.uniform(0, 1000, (64, 2))
+        lines = [raymarch.line_segment_sdf(tuple(s), tuple(s + rng.uniform(-50, 50, 2))) for s in starts]
+        return raymarch.union(lines).compile(accelerate=True)
+    raise ValueError(name)
+
+
+primitives = ['circle', 'line', 'bezier', 'union', 'grid_union']
+
+
+def ray_batch(n: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    angles = rng.uniform(0, 2 * np.pi, n)
+    return rng.uniform(0, 1000, (n, 2)), np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+
+@benchmark('raymarch.march', sdf=primitives, items=lambda sdf: 100, unit='rays')
+def march(sdf):
+    field = primitive(sdf)
+    origins, directions = ray_batch(100)
+
+    def cast():
+        for origin, direction in zip(origins, directions):
+            raymarch.march(field, origin, direction, epsilon=0.5)
+
+    return cast
+
+
+@benchmark('raymarch.march_many', sdf=primitives, items=lambda sdf: rays, unit='rays')
+def march_many(sdf):
+    field = primitive(sdf)
+    origins, directions = ray_batch(rays)
+    return lambda: raymarch.march_many(field, origins, directions, epsilon=0.5)
@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.harness import benchmark
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+modules = ['', 'numpy', 'network.pool', 'network.train', 'raymarching.raymarch', 'cars.car', 'network.render']
+
+
+@benchmark('startup.import', module=modules, items=lambda module: 1, unit='processes')
+def import_module(module):
+    # A fresh interpreter importing one module; the empty module name measures bare interpreter start-up
+    code = f'import {module}' if module else 'pass'
+    env = dict(os.environ, PYTHONPATH=root)
+    return lambda: subprocess.run([sys.executable, '-c', code], cwd=root, env=env, check=True)
+
+
+def _ready():
+    import network.pool
+    return os.getpid()
+
+
+@benchmark('startup.worker', method=['spawn', 'forkserver', 'fork'], items=lambda method: 1, unit='workers')
+def worker(method):
+    # Time from creating a process pool to its first result, as paid by Pool.evaluate when workers start
+    context = multiprocessing.get_context(method)
+
+    def start():
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            executor.submit(_ready).result()
+
+    return start
@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+import numpy as np
+
+from benchmarks.harness import benchmark
+from cars.car import CarEnv
+from cars.track import Bezier, Line, TrackBuilder, generate_image
+from raymarching import raymarch
+
+resolutions = [(270, 180), (540, 360), (1080, 720)]
+
+
+def oval(scale: float) -> list:
+    def p(x, y):
+        return x * scale, y * scale
+
+    return [Line(p(200, 200), p(800, 200)), Bezier(p(800, 200), p(1000, 360), p(800, 520)),
+            Line(p(800, 520), p(200, 520)), Bezier(p(200, 520), p(0, 360), p(200, 200))]
+
+
+@benchmark('track.generate_image', resolution=resolutions, supersample=[1, 2],
+           items=lambda resolution, supersample: resolution[0] * resolution[1], unit='pixels')
+def generate(resolution, supersample):
+    w, h = resolution
+    scale = w / 1080
+    track_width = 30 * scale
+    sdf = raymarch.union([s.sdf for s in oval(scale)]).annular(track_width).compile(accelerate=True)
+    return lambda: generate_image(w, h, sdf, track_width, supersample=supersample)
+
+
+@lru_cache(maxsize=None)
+def oval_track(bake: bool):
+    # One track per setting, since a baking CarEnv stores its tables on the track
+    return TrackBuilder(oval(1), 1080, 720, 30, grid_resolution=1).make_track()
+
+
+@benchmark('cars.step', n_players=[1000, 10000], bake=[False, True],
+           items=lambda n_players, bake: n_players, unit='car-steps')
+def car_step(n_players, bake):
+    env = CarEnv(oval_track(bake), n_players, seed=0, start_jitter=0.3, bake=bake)
+    actions = np.random.default_rng(0).uniform(0.4, 0.6, (n_players, 2))
+
+    def step():
+        env.read_env()
+        env.act(actions)
+        env.update()
+    return step
@@ -0,0 +1,35 @@
+"""Compares two benchmark result files and flags regressions.
+
+    python -m benchmarks.compare BASELINE CURRENT [--threshold 0.1]
+
+Exits with status 1 if any benchmark's median time grew by more than the threshold.
+"""
+import argparse
+import sys
+
+from benchmarks import harness
+
+
+def report(baseline: dict, current: dict, threshold: float = 0.1) -> int:
+    rows = harness.compare(baseline, current, threshold)
+    for name, base, new, ratio, status in rows:
+        print(f'{name:<60} {base * 1e3:10.3f} ms -> {new * 1e3:10.3f} ms  x{ratio:5.2f}  {status}')
+
+    missing = len(set(baseline['results']) - set(current['results']))
+    regressed = [row[0] for row in rows if row[4] == 'REGRESSED']
+    print(f'{len(rows)} compared, {len(regressed)} regressed, '
+          f'{sum(row[4] == "improved" for row in rows)} improved, {missing} not in current run')
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare benchmark results against a baseline.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown counted as a regression')
+    args = parser.parse_args(argv)
+    return report(harness.load(args.baseline), harness.load(args.current), args.threshold)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+
+class Benchmark:
+    """A named benchmark run once for every combination of its parameters.
+
+    ``setup(**params)`` builds whatever state is needed and returns the zero-argument function to time, so setup
+    cost never ends up in the measurement. ``items`` gives the work done by one call (ticks, rays, pixels...) for a
+    given parameter set, and turns the timing into a rate.
+    """
+
+    def __init__(self, name: str, setup: Callable, params: dict, items: Callable | None = None, unit: str = ''):
+        self.name = name
+        self.setup = setup
+        self.params = params
+        self.items = items
+        self.unit = unit
+
+    def cases(self):
+        keys = list(self.params)
+        for values in itertools.product(*(self.params[k] for k in keys)):
+            params = dict(zip(keys, values))
+            label = ','.join(f'{k}={v}' for k, v in params.items())
+            yield (f'{self.name}[{label}]' if label else self.name), params
+
+
+registry: list[Benchmark] = []
+
+
+def benchmark(name: str, items: Callable | None = None, unit: str = '', **params):
+    def register(setup):
+        registry.append(Benchmark(name, setup, {k: list(v) for k, v in params.items()}, items, unit))
+        return setup
+    return register
+
+
+def measure(fn: Callable, repeat: int = 5, min_time: float = 0.1) -> dict:
+    # Picks the number of calls per sample so that a sample lasts at least min_time, then takes repeat samples.
+    # Times are reported per call.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+
+    return {'median': statistics.median(samples),
+            'min': min(samples),
+            'mean': statistics.fmean(samples),
+            'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            'number': number,
+            'repeat': repeat}
+
+
+def run(pattern: str | None = None, repeat: int = 5, min_time: float = 0.1, log=print) -> dict:
+    results = {}
+    for bench in registry:
+        for name, params in bench.cases():
+            if pattern is not None and pattern not in name:
+                continue
+            result = measure(bench.setup(**params), repeat, min_time)
+            result['params'] = params
+            if bench.items is not None:
+                result['items'] = bench.items(**params)
+                result['rate'] = result['items'] / result['median']
+                result['unit'] = bench.unit
+            results[name] = result
+            rate = f'  {result["rate"]:.4g} {bench.unit}/s' if 'rate' in result else ''
+            log(f'{name:<60} {result["median"] * 1e3:10.3f} ms{rate}')
+    return results
+
+
+def machine_info() -> dict:
+    return {'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+
+
+def save(path: str, results: dict, skipped: dict | None = None) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'machine': machine_info(),
+                   'skipped': skipped or {},
+                   'results': results}, f, indent=1)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[tuple[str, float, float, float, str]]:
+    # Returns (name, baseline median, current median, ratio, status) for every benchmark present in both runs.
+    # A benchmark has regressed if its median time grew by more than threshold, and improved if it shrank by as
+    # much.
+    rows = []
+    for name, base in baseline['results'].items():
+        if name not in current['results']:
+            continue
+        new = current['results'][name]
+        ratio = new['median'] / base['median']
+        if ratio > 1 + threshold:
+            status = 'REGRESSED'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        else:
+            status = ''
+        rows.append((name, base['median'], new['median'], ratio, status))
+    return rows
@@ -0,0 +1,53 @@
+"""Runs the benchmark suite and writes the results as JSON.
+
+    python -m benchmarks.run [-k PATTERN] [--output PATH] [--baseline [PATH]]
+
+Benchmarks whose dependencies cannot be imported (pygame, for the Flappy Bird and track modules) are reported as
+skipped. When a baseline is given the run is compared against it, as with ``python -m benchmarks.compare``;
+``--baseline`` on its own compares against the committed ``benchmarks/baseline.json``.
+"""
+import argparse
+import importlib
+import sys
+
+from benchmarks import harness
+from benchmarks.compare import report
+
+modules = ['bench_network', 'bench_pool', 'bench_flappy', 'bench_raymarch', 'bench_track', 'bench_startup']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    parser.add_argument('-k', dest='pattern', default=None, help='only run benchmarks whose name contains this')
+    parser.add_argument('--output', default='benchmarks/results/latest.json')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.1, help='minimum seconds per sample')
+    parser.add_argument('--baseline', nargs='?', const='benchmarks/baseline.json', default=None,
+                        help='results file to compare this run against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown counted as a regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    skipped = {}
+    for module in modules:
+        try:
+            importlib.import_module(f'benchmarks.{module}')
+        except ImportError as e:
+            skipped[module] = str(e)
+            print(f'skipping {module}: {e}')
+
+    results = harness.run(args.pattern, args.repeat, args.min_time)
+    harness.save(args.output, results, skipped)
+    print(f'wrote {len(results)} results to {args.output}')
+
+    if args.baseline is not None:
+        current = harness.load(args.output)
+        return report(harness.load(args.baseline), current, args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,102 @@
-class Car:
+import numpy as np
 
-    def __init__(self, x, y, facing):
-        pass
+from cars.track import Track
+
+
+class CarEnv:
+    """N cars driving on a Track, held as arrays and stepped together.
+
+    Every tick each live car casts ``n_sensors`` rays spread over ``fov`` around its heading through the track SDF.
+    With ``bake`` the track's ray table and progress grid are built on first use (a second or two, once per track)
+    and the rays are interpolated from the table instead of marched.
+    ``read_env`` returns the ``(N, n_sensors + 1)`` matrix of normalised sensor distances plus speed. ``act`` takes
+    network outputs in [0, 1]: output 0 steers and output 1, if present, is throttle. A car dies when it leaves the
+    tarmac or goes ``patience`` ticks without getting further along the track than before. Like the Flappy Bird games
+    it provides read_env / act / update / all_dead / fitness, so it can be passed to Pool.play or Pool.evaluate.
+    Every car starts from the same heading, offset by one ``start_jitter`` draw per environment, so a population
+    split over workers with the same seed starts exactly as it would in one environment.
+    """
+
+    def __init__(self, track: Track, n_players=1, seed=None, n_sensors=7, fov=np.pi, sensor_range=300.0,
+                 max_speed=8.0, acceleration=0.3, drag=0.02, turn_rate=0.08, patience=300, start_jitter=0.0,
+                 bake=True):
+        self.track = track
+        if bake:
+            if track.sensors is None or track.sensors.max_distance < sensor_range:
+                track.bake_sensors(max_distance=sensor_range)
+            if track.centreline is not None and track.centreline.grid is None:
+                track.bake_progress()
+        self.rng = np.random.default_rng(seed)
+
+        self.sensor_angles = np.linspace(-fov / 2, fov / 2, n_sensors)
+        self.sensor_range = sensor_range
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.drag = drag
+        self.turn_rate = turn_rate
+        self.patience = patience
+
+        self.pos = np.tile(np.asarray(track.start, dtype=float), (n_players, 1))
+        self.heading = np.full(n_players, track.start_heading + self.rng.uniform(-start_jitter, start_jitter))
+        self.speed = np.zeros(n_players)
+        self.steering = np.zeros(n_players)
+        self.throttle = np.zeros(n_players)
+
+        self.progress = np.zeros(n_players)
+        self.best_progress = np.zeros(n_players)
+        self.last_progress = np.zeros(n_players, dtype=int)
+        self.dead = np.zeros(n_players, dtype=bool)
+        self.dead_time = np.zeros(n_players, dtype=int)
+
+        self.time = 0
+
+    @property
+    def n_players(self):
+        return len(self.pos)
+
+    def sense(self, cars: np.ndarray) -> np.ndarray:
+        # (len(cars), n_sensors) distances to the track edge along each sensor ray
+        angles = self.heading[cars, None] + self.sensor_angles
+        return self.track.sense(self.pos[cars], angles, self.sensor_range)
+
+    def read_env(self) -> np.ndarray:
+        obs = np.zeros((self.n_players, len(self.sensor_angles) + 1))
+        alive = np.flatnonzero(~self.dead)
+        obs[alive, :-1] = self.sense(alive) / self.sensor_range
+        obs[:, -1] = self.speed / self.max_speed
+        return obs
+
+    def act(self, outputs: np.ndarray):
+        self.steering = outputs[..., 0] * 2 - 1
+        self.throttle = outputs[..., 1] * 2 - 1 if outputs.shape[-1] > 1 else np.ones(self.n_players)
 
     def update(self):
-        pass
+        alive = np.flatnonzero(~self.dead)
+
+        speed = self.speed[alive]
+        speed = np.clip(speed + self.throttle[alive] * self.acceleration - self.drag * speed, 0, self.max_speed)
+        heading = self.heading[alive] + self.steering[alive] * self.turn_rate * speed / self.max_speed
+        prev = self.pos[alive]
+        pos = prev + speed[:, None] * np.stack([np.cos(heading), np.sin(heading)], axis=-1)
+        self.speed[alive], self.heading[alive], self.pos[alive] = speed, heading, pos
+
+        progress = self.track.progress(self.progress[alive], pos)
+        improved = progress > self.best_progress[alive]
+        self.progress[alive] = progress
+        self.best_progress[alive[improved]] = progress[improved]
+        self.last_progress[alive[improved]] = self.time
+
+        off_track = self.track.query(pos) > 0
+        stalled = self.time - self.last_progress[alive] > self.patience
+        died = alive[off_track | stalled]
+        self.dead[died] = True
+        self.dead_time[died] = self.time
+
+        self.time += 1
+
+    def all_dead(self):
+        return bool(self.dead.all())
+
+    def fitness(self) -> np.ndarray:
+        # Furthest distance reached along the centreline
+        return self.best_progress.copy()
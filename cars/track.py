@@ -1,11 +1,17 @@
-import pygame.surfarray
-import tqdm
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
 
 from raymarching import raymarch
-from pgzero.screen import Screen
+from raymarching.distance_grid import RayTable, SampledSDF
+from cars.track_cache import track_key
 from abc import ABC, abstractmethod
 import numpy as np
-import pickle
+import json
+
+if TYPE_CHECKING:
+    from pgzero.screen import Screen
 
 Point = tuple[float, float]
 
@@ -40,6 +46,18 @@ class Segment(ABC):
     def get_tangent_line(self) -> tuple[Point, Point]:
         pass
 
+    @abstractmethod
+    def get_start_tangent(self) -> Point:
+        pass
+
+    @abstractmethod
+    def sample(self, t: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def to_dict(self) -> dict:
+        pass
+
 
 class Line(Segment):
 
@@ -64,6 +82,17 @@ class Line(Segment):
         (sx, sy), (ex, ey) = self.start, self.end
         return self.start, (ex - sx, ey - sy)
 
+    def get_start_tangent(self) -> Point:
+        (sx, sy), (ex, ey) = self.start, self.end
+        return ex - sx, ey - sy
+
+    def sample(self, t: np.ndarray) -> np.ndarray:
+        t = np.asarray(t, dtype=float)[..., None]
+        return (1 - t) * np.asarray(self.start, dtype=float) + t * np.asarray(self.end, dtype=float)
+
+    def to_dict(self) -> dict:
+        return {'type': 'line', 'start': list(self.start), 'end': list(self.end)}
+
 
 class Bezier(Segment):
 
@@ -90,69 +119,378 @@ class Bezier(Segment):
         (sx, sy), (ex, ey) = self.control, self.end
         return self.control, (ex - sx, ey - sy)
 
+    def get_start_tangent(self) -> Point:
+        (sx, sy), (cx, cy) = self.start, self.control
+        return cx - sx, cy - sy
+
+    def sample(self, t: np.ndarray) -> np.ndarray:
+        t = np.asarray(t, dtype=float)[..., None]
+        s, c, e = (np.asarray(p, dtype=float) for p in (self.start, self.control, self.end))
+        return c + np.square(1 - t) * (s - c) + np.square(t) * (e - c)
+
+    def to_dict(self) -> dict:
+        return {'type': 'bezier', 'start': list(self.start), 'control': list(self.control), 'end': list(self.end)}
+
+
+def segment_from_dict(data: dict) -> Segment:
+    if data['type'] == 'line':
+        return Line(tuple(data['start']), tuple(data['end']))
+    if data['type'] == 'bezier':
+        return Bezier(tuple(data['start']), tuple(data['control']), tuple(data['end']))
+    raise ValueError(f'Unknown segment type: {data["type"]}')
+
+
+def segments_cross(p1: np.ndarray, p2: np.ndarray, q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
+    # Whether segment p1 -> p2 crosses q1 -> q2, for (..., 2) arrays of endpoints
+    def cross(u, v):
+        return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+    q = q2 - q1
+    p = p2 - p1
+    return (((cross(q, p1 - q1) > 0) != (cross(q, p2 - q1) > 0)) &
+            ((cross(p, q1 - p1) > 0) != (cross(p, q2 - p1) > 0)))
+
+
+class Centreline:
+    """The track centreline flattened to a polyline with a cumulative arc-length table.
+
+    Line segments contribute one edge and Bezier segments ``samples`` edges. ``project`` maps points to their
+    distance along the line by checking every edge. ``advance`` only checks the ``window`` edges either side of each
+    car's previous progress, so its cost does not grow with the track. It accumulates the result into an unwrapped
+    progress value that keeps counting across laps. Cars must not move further than ``window`` edges in one step.
+    After ``bake`` it interpolates a grid of projected arc lengths instead, and only searches edges for points whose
+    grid cell straddles a jump in the nearest point.
+    """
+
+    def __init__(self, vertices: np.ndarray, closed: bool):
+        self.vertices = np.asarray(vertices, dtype=float)
+        self.starts = self.vertices[:-1]
+        self.edges = np.diff(self.vertices, axis=0)
+        self.lengths = np.linalg.norm(self.edges, axis=1)
+        self.arc = np.concatenate([[0], np.cumsum(self.lengths)[:-1]])
+        self.length = float(self.lengths.sum())
+        self.closed = closed
+        self._inv_len2 = 1 / np.maximum(np.square(self.lengths), 1e-12)
+        self.grid: np.ndarray | None = None
+        self.grid_origin = np.zeros(2)
+        self.grid_spacing = 1.0
+
+    @classmethod
+    def from_segments(cls, segments: list[Segment], samples: int = 32) -> 'Centreline':
+        pieces = []
+        for segment in segments:
+            t = np.linspace(0, 1, 2 if isinstance(segment, Line) else samples + 1)
+            pieces.append(segment.sample(t[:-1]))
+        end = np.asarray(segments[-1].get_end_point(), dtype=float)
+        vertices = np.concatenate(pieces + [end[None]])
+        closed = bool(np.allclose(end, vertices[0]))
+        return cls(vertices, closed)
+
+    def project(self, points: np.ndarray, chunk: int = 1 << 20) -> tuple[np.ndarray, np.ndarray]:
+        # Arc length of the closest point on the centreline, and the distance to it, for (..., 2) points
+        points = np.asarray(points, dtype=float)
+        flat = points.reshape(-1, 2)
+        arc = np.empty(len(flat))
+        distance = np.empty(len(flat))
+        step = max(1, chunk // len(self.edges))
+        for i in range(0, len(flat), step):
+            rel = flat[i:i + step, None, :] - self.starts
+            t = np.clip(np.einsum('nmk,mk->nm', rel, self.edges) * self._inv_len2, 0, 1)
+            d2 = np.square(rel - t[..., None] * self.edges).sum(axis=-1)
+            nearest = np.argmin(d2, axis=1)
+            rows = np.arange(len(nearest))
+            arc[i:i + step] = self.arc[nearest] + t[rows, nearest] * self.lengths[nearest]
+            distance[i:i + step] = np.sqrt(d2[rows, nearest])
+        return arc.reshape(points.shape[:-1]), distance.reshape(points.shape[:-1])
+
+    def bake(self, bounds: tuple[float, float, float, float], spacing: float = 2.0) -> np.ndarray:
+        x0, y0, x1, y1 = bounds
+        xs = x0 + np.arange(int(np.floor((x1 - x0) / spacing)) + 1) * spacing
+        ys = y0 + np.arange(int(np.floor((y1 - y0) / spacing)) + 1) * spacing
+        self.grid = self.project(np.stack(np.meshgrid(xs, ys, indexing='ij'), axis=-1))[0].astype(np.float32)
+        self.grid_origin = np.array([x0, y0], dtype=float)
+        self.grid_spacing = float(spacing)
+        return self.grid
+
+    def interpolate(self, points: np.ndarray, arc: np.ndarray, window: int = 3) -> np.ndarray:
+        # Baked arc length at (N, 2) points. Cells straddling the start line of a closed track are unwrapped first.
+        # Cells whose corners still disagree by more than a couple of cells, across a jump in the nearest edge, are
+        # projected onto the edges near arc instead.
+        nx, ny = self.grid.shape
+        u = np.clip((points - self.grid_origin) / self.grid_spacing, 0, [nx - 1, ny - 1])
+        i = np.minimum(u.astype(np.int64), [nx - 2, ny - 2])
+        f = u - i
+        index = i[:, 0] * ny + i[:, 1]
+        flat = self.grid.reshape(-1)
+        corners = [flat[index], flat[index + 1], flat[index + ny], flat[index + ny + 1]]
+
+        def spread(c00, c01, c10, c11):
+            high = np.maximum(np.maximum(c00, c01), np.maximum(c10, c11))
+            return high - np.minimum(np.minimum(c00, c01), np.minimum(c10, c11))
+
+        fold = spread(*corners) > 4 * self.grid_spacing
+        if self.closed and fold.any():
+            for c in corners:
+                c[fold] += self.length * (c[fold] < self.length / 2)
+            fold[fold] = spread(*(c[fold] for c in corners)) > 4 * self.grid_spacing
+
+        c00, c01, c10, c11 = corners
+        near = c00 + (c01 - c00) * f[:, 1]
+        far = c10 + (c11 - c10) * f[:, 1]
+        result = near + (far - near) * f[:, 0]
+        if fold.any():
+            result[fold] = self.project_near(points[fold], arc[fold], window)[0]
+        return result
+
+    def project_near(self, points: np.ndarray, arc: np.ndarray, window: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        # As project, for (N, 2) points, but only searching the edges within window of the edge at arc length arc
+        m = len(self.edges)
+        if 2 * window + 1 >= m:
+            return self.project(points)
+        points = np.asarray(points, dtype=float)
+        if self.closed:
+            arc = np.mod(arc, self.length)
+        centre = np.clip(np.searchsorted(self.arc, arc, side='right') - 1, 0, m - 1)
+        ix = centre[:, None] + np.arange(-window, window + 1)
+        ix = np.mod(ix, m) if self.closed else np.clip(ix, 0, m - 1)
+
+        rel = points[:, None, :] - self.starts[ix]
+        edges = self.edges[ix]
+        t = np.clip(np.einsum('nwk,nwk->nw', rel, edges) * self._inv_len2[ix], 0, 1)
+        d2 = np.square(rel - t[..., None] * edges).sum(axis=-1)
+        nearest = np.argmin(d2, axis=1)
+        rows = np.arange(len(nearest))
+        edge = ix[rows, nearest]
+        return self.arc[edge] + t[rows, nearest] * self.lengths[edge], np.sqrt(d2[rows, nearest])
+
+    def advance(self, progress: np.ndarray, points: np.ndarray, window: int = 3) -> np.ndarray:
+        # New unwrapped progress for cars at points, given their previous progress. On a closed track the shortest
+        # way round from the previous position is taken, so crossing the start line keeps counting up.
+        if self.grid is None:
+            arc, _ = self.project_near(points, progress, window)
+        else:
+            arc = self.interpolate(points, progress, window)
+        if not self.closed:
+            return arc
+        delta = arc - np.mod(progress, self.length)
+        delta -= self.length * np.round(delta / self.length)
+        return progress + delta
+
 
 class Track:
 
-    def __init__(self, sdf: raymarch.SDF, start: tuple[float, float], checkpoints, image):
+    def __init__(self, sdf: raymarch.SDF, start: tuple[float, float], checkpoints, image, start_heading: float = 0,
+                 centreline: Centreline | None = None):
+        # checkpoints is a sequence of gates, each a pair of end points, crossed in order starting from gate 1
         self.sdf = sdf
         self.start = start
-        self.checkpoints = checkpoints
+        self.start_heading = start_heading
+        self.centreline = centreline
+        self.checkpoints = np.asarray(checkpoints, dtype=float).reshape(-1, 2, 2)
         self.image = image
-        self.surf = pygame.surfarray.make_surface(image)
+        self.surf = None
+        self.field: SampledSDF | None = None
+        self.sensors: RayTable | None = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['surf'] = None
+        return state
+
+    def bake(self, resolution: float = 1.0, band: float = 0.0) -> SampledSDF:
+        # Samples the SDF over the image every `resolution` pixels. Queries within `band` of the track edge, or
+        # outside the image, still use the exact SDF.
+        width, height = self.image.shape[:2]
+        self.field = SampledSDF.bake(self.sdf, (0, 0, width - 1, height - 1), resolution, band)
+        return self.field
+
+    def bake_progress(self, spacing: float = 2.0) -> np.ndarray:
+        # Tabulates the centreline projection so `progress` interpolates instead of searching edges
+        if self.centreline is None:
+            raise ValueError('This track has no centreline to measure progress along')
+        width, height = self.image.shape[:2]
+        return self.centreline.bake((0, 0, width - 1, height - 1), spacing)
+
+    def bake_sensors(self, spacing: float = 4.0, n_angles: int = 128, max_distance: float = 300.0) -> RayTable:
+        # Tabulates ray distances from origins on the track so `sense` interpolates instead of marching
+        width, height = self.image.shape[:2]
+        field = self.sdf if self.field is None else self.field
+        self.sensors = RayTable.bake(field, (0, 0, width - 1, height - 1), spacing, n_angles, max_distance)
+        return self.sensors
+
+    def sense(self, origins: np.ndarray, angles: np.ndarray, max_distance: float) -> np.ndarray:
+        # Distances to the track edge from (N, 2) origins along (N, K) angles
+        if self.sensors is not None and self.sensors.max_distance >= max_distance:
+            return np.minimum(self.sensors.lookup(origins, angles), max_distance)
+        directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1).reshape(-1, 2)
+        origins = np.repeat(origins, angles.shape[1], axis=0)
+        data = self.march(origins, directions, epsilon=0.5, max_distance=max_distance, max_steps=32)
+        return data.distance.reshape(angles.shape)
+
+    def query(self, points: np.ndarray, exact: bool = False) -> np.ndarray:
+        field = self.sdf if exact or self.field is None else self.field
+        return field.query_many(points)
+
+    def march(self, origins: np.ndarray, directions: np.ndarray, exact: bool = False,
+              **kwargs) -> raymarch.RayMarchData:
+        field = self.sdf if exact or self.field is None else self.field
+        return raymarch.march_many(field, origins, directions, **kwargs)
 
     def display(self, screen: Screen):
+        if self.surf is None:
+            import pygame.surfarray
+            self.surf = pygame.surfarray.make_surface(self.image)
         screen.blit(self.surf, (0, 0))
 
-    def check_progress(self, checkpoint) -> tuple[int, bool]:
-        pass
+    def check_progress(self, checkpoint: np.ndarray, prev: np.ndarray,
+                       pos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # For each car moving prev -> pos towards gate `checkpoint`, returns the next gate index and whether the
+        # gate was crossed this step. Indices keep counting past the last gate, wrapping onto the first.
+        gates = self.checkpoints[np.asarray(checkpoint) % len(self.checkpoints)]
+        crossed = segments_cross(prev, pos, gates[..., 0, :], gates[..., 1, :])
+        return checkpoint + crossed, crossed
+
+    def progress(self, progress: np.ndarray, pos: np.ndarray) -> np.ndarray:
+        # Distance travelled along the centreline, continuous and counting up over laps
+        if self.centreline is None:
+            raise ValueError('This track has no centreline to measure progress along; build it with TrackBuilder '
+                             'or pass centreline=Centreline.from_segments(segments)')
+        return self.centreline.advance(progress, pos)
 
 
-def generate_image(width: int, height: int, sdf: raymarch.SDF, track_width: float):
-    img = np.zeros((width, height, 3))
-    for r, _r in tqdm.tqdm(enumerate(img), total=width):
-        # print('{:.2f}% done'.format(r / width * 100))
-        for c, _ in enumerate(_r):
-            d = sdf.query((r, c))
-            if d < 2-track_width:
-                img[r, c, :] = [230, 230, 230]
-            elif d < 0:
-                img[r, c, :] = [10, 10, 15]
-            elif d < 5:
-                img[r, c, :] = [200, 200, 0]
-            else:
-                img[r, c, :] = [0, 150, 0]
+track_palette = np.array([[230, 230, 230], [10, 10, 15], [200, 200, 0], [0, 150, 0]], dtype=np.uint8)
+
+
+def classify_distances(d: np.ndarray, track_width: float) -> np.ndarray:
+    # Palette index per distance: centre line, tarmac, kerb, grass
+    return np.where(d < 2 - track_width, 0, np.where(d < 0, 1, np.where(d < 5, 2, 3)))
+
+
+def _rasterize_tile(sdf: raymarch.SDF, track_width: float, x0: int, x1: int, y0: int, y1: int,
+                    supersample: int, block: int) -> np.ndarray:
+    offsets = (np.arange(supersample) + 0.5) / supersample - 0.5
+    xs, ys = np.arange(x0, x1), np.arange(y0, y1)
+
+    # The SDF is 1-Lipschitz, so a block whose centre is further than its half diagonal from every colour
+    # threshold is a single colour and needs no per-pixel samples
+    bx, by = np.arange(x0, x1, block), np.arange(y0, y1, block)
+    centres = np.stack(np.meshgrid(np.minimum(bx + (block - 1) / 2, x1 - 0.5),
+                                   np.minimum(by + (block - 1) / 2, y1 - 0.5), indexing='ij'), axis=-1)
+    centre_d = sdf.query_many(centres)
+    reach = block / np.sqrt(2) + 1
+    thresholds = np.array([2 - track_width, 0, 5])
+    uniform = np.all(np.abs(centre_d[..., None] - thresholds) > reach, axis=-1)
+
+    block_class = classify_distances(centre_d, track_width)
+    tile = track_palette[np.repeat(np.repeat(block_class, block, 0), block, 1)[:len(xs), :len(ys)]].astype(float)
+
+    mixed = ~np.repeat(np.repeat(uniform, block, 0), block, 1)[:len(xs), :len(ys)]
+    if mixed.any():
+        ix, iy = np.nonzero(mixed)
+        colour = np.zeros((len(ix), 3))
+        for ox in offsets:
+            for oy in offsets:
+                points = np.stack([xs[ix] + ox, ys[iy] + oy], axis=-1)
+                colour += track_palette[classify_distances(sdf.query_many(points), track_width)]
+        tile[ix, iy] = colour / supersample ** 2
+
+    return np.rint(tile).astype(np.uint8)
+
+
+_worker_sdf: raymarch.SDF | None = None
+
+
+def _init_raster_worker(sdf: raymarch.SDF):
+    global _worker_sdf
+    _worker_sdf = sdf
+
+
+def _rasterize_worker_tile(args) -> np.ndarray:
+    return _rasterize_tile(_worker_sdf, *args)
+
+
+def generate_image(width: int, height: int, sdf: raymarch.SDF, track_width: float, tile: int = 256,
+                   supersample: int = 1, workers: int | None = None, block: int = 8) -> np.ndarray:
+    # Returns a (width, height, 3) uint8 image. Pixel (x, y) is sampled at (x, y), or on a supersample x supersample
+    # grid around it whose colours are averaged. Tiles can be spread over a process pool if the SDF is picklable.
+    img = np.zeros((width, height, 3), dtype=np.uint8)
+    tiles = [(x0, min(x0 + tile, width), y0, min(y0 + tile, height))
+             for x0 in range(0, width, tile) for y0 in range(0, height, tile)]
+    jobs = [(track_width, *bounds, supersample, block) for bounds in tiles]
+
+    if workers is None or workers <= 1:
+        results = (_rasterize_tile(sdf, *job) for job in jobs)
+        for (x0, x1, y0, y1), result in zip(tiles, results):
+            img[x0:x1, y0:y1] = result
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_raster_worker, initargs=(sdf,)) as executor:
+            for (x0, x1, y0, y1), result in zip(tiles, executor.map(_rasterize_worker_tile, jobs)):
+                img[x0:x1, y0:y1] = result
 
     return img
 
 
 class TrackBuilder:
 
-    def __init__(self, track_segments: list[Segment], width: int, height: int, track_width: float):
+    def __init__(self, track_segments: list[Segment], width: int, height: int, track_width: float,
+                 cache=None, grid_resolution: float | None = None, supersample: int = 1):
+        # cache is an optional cars.track_cache.TrackCache. grid_resolution bakes a distance grid into the track.
         self.track_segments = track_segments
         self.start = track_segments[0].get_start_point()
+        self.width = width
+        self.height = height
         self.track_width = track_width
 
-        sdf = self.track_segments[0].sdf
-        for segment in self.track_segments[1:]:
-            sdf += segment.sdf
-        sdf.annular(self.track_width)
-
-        self.track_img = generate_image(width, height, sdf, self.track_width)
+        segments_sdf = raymarch.union([segment.sdf for segment in self.track_segments])
+        self.sdf = segments_sdf.annular(self.track_width).compile(accelerate=True)
+
+        segments = [segment.to_dict() for segment in self.track_segments]
+        options = {'width': width, 'height': height, 'track_width': track_width,
+                   'grid_resolution': grid_resolution, 'supersample': supersample}
+        key = None if cache is None else track_key(segments, **options)
+        entry = None if cache is None else cache.get(key)
+
+        self.grid: SampledSDF | None = None
+        if entry is not None:
+            self.track_img = entry['image']
+            if entry['grid_path'] is not None:
+                self.grid = SampledSDF.load(entry['grid_path'], exact=self.sdf)
+        else:
+            self.track_img = generate_image(width, height, self.sdf, self.track_width, supersample=supersample)
+            if grid_resolution is not None:
+                self.grid = SampledSDF.bake(self.sdf, (0, 0, width - 1, height - 1), grid_resolution)
+            if cache is not None:
+                cache.put(key, segments, self.track_img, options, self.grid)
+
+    def checkpoint_gates(self) -> np.ndarray:
+        # One gate across the track at the start of every segment, perpendicular to the direction of travel
+        gates = []
+        for segment in self.track_segments:
+            centre = np.array(segment.get_start_point(), dtype=float)
+            tangent = np.array(segment.get_start_tangent(), dtype=float)
+            normal = np.array([-tangent[1], tangent[0]]) / np.linalg.norm(tangent)
+            gates.append([centre - normal * self.track_width, centre + normal * self.track_width])
+        return np.array(gates)
 
     def make_track(self) -> Track:
-        sdf = self.track_segments[0].sdf
-        for segment in self.track_segments[1:]:
-            sdf += segment.sdf
-        sdf.annular(self.track_width)
-        return Track(sdf, self.start, [], self.track_img)
+        tx, ty = self.track_segments[0].get_start_tangent()
+        track = Track(self.sdf, self.start, self.checkpoint_gates(), self.track_img, np.arctan2(ty, tx),
+                      Centreline.from_segments(self.track_segments))
+        track.field = self.grid
+        return track
 
     def save(self, filepath: str) -> None:
-        with open(filepath, 'wb') as f:
-            pickle.dump(self, f)
+        # Only the segment geometry and build settings are stored; the SDF and image are rebuilt on load
+        with open(filepath, 'w') as f:
+            json.dump({'segments': [segment.to_dict() for segment in self.track_segments],
+                       'width': self.width,
+                       'height': self.height,
+                       'track_width': self.track_width}, f)
 
 
-def load_from_file(filepath) -> TrackBuilder:
-    with open(filepath, 'rb') as f:
-        track_builder: TrackBuilder = pickle.load(f)
+def load_from_file(filepath, cache=None) -> TrackBuilder:
+    with open(filepath) as f:
+        data = json.load(f)
 
-    return track_builder
+    segments = [segment_from_dict(segment) for segment in data['segments']]
+    return TrackBuilder(segments, data['width'], data['height'], data['track_width'], cache=cache)
@@ -8,6 +8,7 @@ from pygame import Rect
 from pgzero import keyboard
 from enum import Enum
 from track import *
+from cars.track_cache import TrackCache
 
 TITLE = 'Track'
 WIDTH = 1080
@@ -123,6 +124,8 @@ show_grid = False
 
 track: Track | None = None
 
+track_cache = TrackCache('track_cache')
+
 
 def snap_nearest(x, y):
     return round(x / 60) * 60, round(y / 60) * 60
@@ -185,8 +188,8 @@ def on_key_down(key):
         # Generate track
         if track is None:
             print('Generating Track')
-            builder = TrackBuilder(track_pieces, 30)
-            track = builder.make_track(WIDTH, HEIGHT)
+            builder = TrackBuilder(track_pieces, WIDTH, HEIGHT, 30, cache=track_cache)
+            track = builder.make_track()
         else:
             track = None
     if key == keyboard.keys.G:
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from os.path import join, exists, getsize
+
+import numpy as np
+
+
+cache_version = 2
+
+
+def track_key(segments: list[dict], **options) -> str:
+    # Content address of a track: its segment geometry plus everything that changes the rendered output. Bump
+    # cache_version whenever the SDF code changes the distances an existing entry was built from.
+    description = json.dumps({'segments': segments, 'version': cache_version, **options}, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class TrackCache:
+    """On-disk cache of built tracks keyed by a hash of their segments and build options.
+
+    Each entry is a directory holding ``meta.json`` (segments and options), ``image.npy`` and optionally the baked
+    distance grid as ``grid.npy`` / ``grid.json``. Arrays are memory-mapped on load. Once the cache grows past
+    ``max_bytes`` the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> dict | None:
+        entry = join(self.directory, key)
+        if not exists(join(entry, 'meta.json')):
+            return None
+        with open(join(entry, 'meta.json')) as f:
+            meta = json.load(f)
+        os.utime(join(entry, 'meta.json'))
+
+        meta['image'] = np.load(join(entry, 'image.npy'), mmap_mode='r')
+        meta['grid_path'] = join(entry, 'grid') if exists(join(entry, 'grid.npy')) else None
+        return meta
+
+    def put(self, key: str, segments: list[dict], image: np.ndarray, options: dict, grid=None) -> None:
+        entry = join(self.directory, key)
+        if exists(entry):
+            return
+
+        # Build the entry beside the cache and rename it into place so readers never see half an entry
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        np.save(join(tmp, 'image.npy'), np.asarray(image))
+        if grid is not None:
+            grid.save(join(tmp, 'grid'))
+        with open(join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'segments': segments, 'options': options}, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        # (last access time, size in bytes, key) of every complete entry
+        entries = []
+        for key in os.listdir(self.directory):
+            meta_path = join(self.directory, key, 'meta.json')
+            if key.startswith('.') or not exists(meta_path):
+                continue
+            entry = join(self.directory, key)
+            size = sum(getsize(join(entry, name)) for name in os.listdir(entry))
+            entries.append((os.stat(meta_path).st_mtime, size, key))
+        return entries
+
+    def evict(self, keep: str | None = None) -> None:
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(join(self.directory, key), ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        for _, _, key in self.entries():
+            shutil.rmtree(join(self.directory, key), ignore_errors=True)
@@ -0,0 +1,2 @@
+# raymarch_test.py is a pgzero demo run from inside raymarching/, not a pytest module
+collect_ignore = ['raymarching/raymarch_test.py']
@@ -83,7 +83,9 @@ class FlappyGame:
     pipe_width = 100
     pipe_speed = 2
 
-    def __init__(self, width, height, n_players=1):
+    def __init__(self, width, height, n_players=1, seed=None):
+
+        self.random = random.Random(seed)
 
         self.width = width
         self.height = height
@@ -99,7 +101,7 @@ class FlappyGame:
             pipe.update(-FlappyGame.pipe_speed)
         self.pipes = list(filter(lambda p: p.x > -FlappyGame.pipe_width, self.pipes))
         if len(self.pipes) == 0 or self.pipes[-1].x < self.width - FlappyGame.pipe_spacing:
-            h = random.randint(FlappyGame.pipe_opening, self.height)
+            h = self.random.randint(FlappyGame.pipe_opening, self.height)
 
             def f(x):
                 x2 = min(max(x, 0), 1)
@@ -0,0 +1,154 @@
+import random
+from typing import Sequence
+
+import numpy as np
+
+
+def pipe_opening(time, start=1000, end=5000, upper=200, lower=200 / 3):
+    x = min(max((time - start) / (end - start), 0), 1)
+    return (lower - upper) * (-2 * x ** 3 + 3 * x ** 2) + upper
+
+
+class VectorFlappyGame:
+    """Headless FlappyGame with every bird held in NumPy arrays.
+
+    Given the same seed and the same jump decisions it reproduces FlappyGame tick for tick, including pygame's
+    truncation of the pipe rectangles to integers.
+    """
+    bird_x = 100
+    bird_radius = 20
+
+    pipe_opening = 200
+    pipe_spacing = 500
+    pipe_width = 100
+    pipe_speed = 2
+
+    def __init__(self, width, height, n_players=1, seed=None):
+        self._setup(width, height, (), n_players, [seed])
+
+    def _setup(self, width, height, envs: tuple[int, ...], n_players, seeds):
+        # Bird state is envs + (n_players,). Pipes move and spawn at the same ticks in every game, so their x
+        # positions and openings are shared and only the heights are envs + (n_pipes,).
+        self.randoms = [random.Random(seed) for seed in seeds]
+
+        self.width = width
+        self.height = height
+
+        self.pipe_x = np.array([float(width)])
+        self.pipe_y = np.full(envs + (1,), height / 2)
+        self.pipe_opening = np.array([float(VectorFlappyGame.pipe_opening)])
+
+        self.y = np.full(envs + (n_players,), height / 2)
+        self.dy = np.zeros(envs + (n_players,))
+        self.dead = np.zeros(envs + (n_players,), dtype=bool)
+        self.dead_time = np.zeros(envs + (n_players,), dtype=int)
+        self.jumping = np.zeros(envs + (n_players,), dtype=bool)
+
+        self.time = 0
+
+    @property
+    def n_players(self):
+        return self.y.shape[-1]
+
+    @property
+    def pipes(self) -> np.ndarray:
+        # Rows of [x, y, width, opening]
+        x, y, opening = np.broadcast_arrays(self.pipe_x, self.pipe_y, self.pipe_opening)
+        return np.stack([x, y, np.full_like(x, VectorFlappyGame.pipe_width), opening], axis=-1)
+
+    def rectangles(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Top and bottom rectangle of every pipe, each component shaped (..., n_pipes, 2)
+        x, y, opening = self.pipe_x, self.pipe_y, self.pipe_opening
+        rx = np.trunc(np.stack([x, x], axis=-1))
+        ry = np.trunc(np.stack([np.zeros_like(y), y], axis=-1))
+        rw = np.full_like(rx, VectorFlappyGame.pipe_width)
+        rh = np.trunc(np.stack([y - opening, self.height - y], axis=-1))
+        return rx, ry, rw, rh
+
+    def update(self):
+        self.pipe_x -= VectorFlappyGame.pipe_speed
+        keep = self.pipe_x > -VectorFlappyGame.pipe_width
+        self.pipe_x, self.pipe_y, self.pipe_opening = self.pipe_x[keep], self.pipe_y[..., keep], self.pipe_opening[keep]
+        if len(self.pipe_x) == 0 or self.pipe_x[-1] < self.width - VectorFlappyGame.pipe_spacing:
+            heights = [r.randint(VectorFlappyGame.pipe_opening, self.height) for r in self.randoms]
+            opening = pipe_opening(self.time, upper=VectorFlappyGame.pipe_opening,
+                                   lower=VectorFlappyGame.pipe_opening / 3)
+            self.pipe_x = np.append(self.pipe_x, self.width)
+            self.pipe_y = np.concatenate([self.pipe_y, np.reshape(heights, self.pipe_y.shape[:-1] + (1,))], axis=-1)
+            self.pipe_opening = np.append(self.pipe_opening, opening)
+
+        alive = ~self.dead
+        self.dy[alive] = np.clip(self.dy[alive] - 10 * self.jumping[alive] + 0.8, -15, 15)
+        self.y[alive] += self.dy[alive]
+        self.jumping[:] = False
+
+        hit = (self.y > self.height) | (self.y < 0)
+
+        rx, ry, rw, rh = self.rectangles()
+        by = self.y[..., None, None]
+        nx = np.clip(VectorFlappyGame.bird_x, rx, rx + rw)
+        ny = np.clip(by, ry[..., None, :, :], (ry + rh)[..., None, :, :])
+        hit |= ((VectorFlappyGame.bird_x - nx) ** 2 + (by - ny) ** 2
+                < VectorFlappyGame.bird_radius ** 2).any(axis=(-2, -1))
+
+        died = alive & hit
+        self.dead |= died
+        self.dead_time[died] = self.time
+
+        self.time += 1
+
+    def read_env(self) -> np.ndarray:
+        obs = np.empty(self.y.shape + (5,))
+        obs[..., 0] = self.y / self.height
+        obs[..., 1] = (self.pipe_x[0] - VectorFlappyGame.bird_x) / self.width
+        obs[..., 2] = np.trunc(self.pipe_y[..., :1] - self.pipe_opening[0]) / self.height
+        obs[..., 3] = np.trunc(self.pipe_y[..., :1]) / self.height
+        obs[..., 4] = self.dy / 15
+        return obs
+
+    def act(self, outputs: np.ndarray):
+        self.jumping[:] = outputs[..., 0] > 0.5
+
+    def all_dead(self):
+        return bool(self.dead.all())
+
+    def snapshot(self) -> dict:
+        # Copies of what a renderer needs: bird heights, which birds are dead and the pipe rectangles as
+        # (..., n_pipes, 2, 4) rows of [x, y, w, h]
+        return {'y': self.y.copy(), 'dead': self.dead.copy(), 'pipes': np.stack(self.rectangles(), axis=-1)}
+
+    def fitness(self) -> np.ndarray:
+        return np.where(self.dead, self.dead_time, self.time)
+
+
+class MultiFlappyGame(VectorFlappyGame):
+    """E independent games of P birds each, stepped in lockstep as one ``(E, P)`` state.
+
+    Game ``e`` is identical to ``VectorFlappyGame(width, height, P, seeds[e])``. ``read_env`` returns an
+    ``(E, P, 5)`` observation tensor and ``fitness`` aggregates each bird's score over the games.
+    """
+
+    def __init__(self, width, height, n_envs=1, n_players=1, seeds: Sequence[int] | None = None, reduce='mean',
+                 seed=None):
+        if seeds is None:
+            seed_source = random.Random(seed)
+            seeds = [None if seed is None else seed_source.getrandbits(32) for _ in range(n_envs)]
+        if len(seeds) != n_envs:
+            raise ValueError(f'Expected {n_envs} seeds, got {len(seeds)}')
+        self.reduce = reduce
+        self._setup(width, height, (n_envs,), n_players, seeds)
+
+    @property
+    def n_envs(self):
+        return self.y.shape[0]
+
+    def env_fitness(self) -> np.ndarray:
+        return super().fitness()
+
+    def fitness(self, reduce=None) -> np.ndarray:
+        # reduce is 'mean', 'min', 'median', 'max' or a percentile in [0, 100]
+        reduce = self.reduce if reduce is None else reduce
+        f = self.env_fitness()
+        if isinstance(reduce, str):
+            return getattr(np, reduce)(f, axis=0)
+        return np.percentile(f, reduce, axis=0)
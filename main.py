@@ -1,22 +1,44 @@
+import functools
+import sys
+
 from flappybird.flappy_bird import FlappyGame
+from flappybird.vector_flappy import VectorFlappyGame
 import pgzrun
+from pygame import Rect
 from network.pool import *
+from network.telemetry import Telemetry
+from network.trainer import BackgroundTrainer
 
 TITLE = 'Neural Networks'
 
 WIDTH = 1080
 HEIGHT = 720
 
-pool = Pool(population=200,
-            topology=[5, 5, 1],
-            crossover_selector=weighted_selector,
-            mutation_rate=0.01,
-            carry_over=1)
+# With --background the pool trains on its own thread as fast as it can and the window only shows its latest snapshot
+background = '--background' in sys.argv
+args = [arg for arg in sys.argv[1:] if arg != '--background']
+
+if args:
+    # View a checkpoint (gen_N.npz) written by `python -m network.train --checkpoint-dir ...`
+    pool = load_checkpoint(args[0], telemetry=Telemetry())
+else:
+    pool = Pool(population=200,
+                topology=[5, 5, 1],
+                crossover_selector=weighted_selector,
+                mutation_rate=0.01,
+                carry_over=1,
+                telemetry=Telemetry())
 
 game = FlappyGame(WIDTH, HEIGHT, n_players=pool.population)
 
 tick_speed = 1
 
+if background:
+    trainer = BackgroundTrainer(pool, functools.partial(VectorFlappyGame, WIDTH, HEIGHT))
+    viewer = Network(pool.topology, activation=pool.activation)
+    viewer.record = True
+    trainer.start()
+
 
 def on_key_down(key):
     global tick_speed
@@ -29,32 +51,59 @@ def on_key_down(key):
 def update():
     global game
 
+    if background:
+        return
+
     for _ in range(tick_speed):
         game.update()
 
-        for i, (network, agent) in enumerate(zip(pool.candidates, game.birds)):
+        alive = np.array([not agent.dead for agent in game.birds])
+        for i, agent in enumerate(game.birds):
             if agent.dead:
                 pool.fitnesses[i] = agent.dead_time
-            else:
-                v = network.simulate(agent.read_env())
-                agent.jumping = v[0] > 0.5
+
+        outputs = pool.simulate_all(np.array([agent.read_env() for agent in game.birds]), alive)
+        for agent, v in zip(game.birds, outputs):
+            agent.jumping = v[0] > 0.5
 
         if game.all_dead():
             pool.next_generation()
             game = FlappyGame(WIDTH, HEIGHT, n_players=pool.population)
 
 
+def draw_snapshot(snapshot):
+    for x, y, w, h in snapshot.state['pipes'].reshape(-1, 4):
+        screen.draw.rect(Rect(x, y, w, h), (0, 0, 0))
+    for y in snapshot.state['y'][~snapshot.state['dead']]:
+        screen.draw.circle((VectorFlappyGame.bird_x, y), VectorFlappyGame.bird_radius, (0, 0, 0))
+
+    # Reusing one Network keeps its rendered weight graph cached until the champion's weights change
+    viewer.params[:] = snapshot.params
+    viewer.simulate(snapshot.inputs)
+    viewer.draw(screen, WIDTH - 200, 10, 200, 100)
+    screen.draw.text(f'generation {snapshot.generation}  tick {snapshot.tick}', (10, 10), color=(0, 0, 0))
+
+
 def draw():
     screen.fill((255, 255, 255))
+
+    if background:
+        if trainer.snapshot is not None:
+            draw_snapshot(trainer.snapshot)
+        return
+
     game.draw(screen)
 
     if not game.birds[-1].dead:
-        pool.candidates[-1].draw(screen, WIDTH - 200, 10, 200, 100)
+        shown = -1
     else:
-        for i, network in enumerate(pool.candidates):
-            if not game.birds[i].dead:
-                network.draw(screen, WIDTH - 200, 10, 200, 100)
-                break
+        shown = next((i for i, agent in enumerate(game.birds) if not agent.dead), None)
+
+    if shown is not None:
+        network = pool.candidates[shown]
+        network.record = True
+        network.simulate(game.birds[shown].read_env())
+        network.draw(screen, WIDTH - 200, 10, 200, 100)
 
 
 pgzrun.go()
@@ -0,0 +1,130 @@
+import json
+import os
+from os.path import join, exists
+
+import numpy as np
+
+from network.network import Network, genome_layout
+
+
+class RunArchive:
+    """Append-only record of every generation of a run.
+
+    Genomes are stored as one raw ``(generations, population, n_params)`` file and fitnesses as a
+    ``(generations, population)`` table next to it. Both are read through ``np.memmap``, so looking at one
+    generation only touches the pages it needs. ``header.json`` holds the shape and the number of complete
+    generations, and is rewritten after the data so a crash mid-append never exposes a partial generation.
+    """
+
+    def __init__(self, directory, topology=None, population=None, dtype=np.float32):
+        self.directory = directory
+        header_path = join(directory, 'header.json')
+
+        if exists(header_path):
+            with open(header_path) as f:
+                header = json.load(f)
+        else:
+            if topology is None or population is None:
+                raise FileNotFoundError(f'No run archive in {directory}')
+            os.makedirs(directory, exist_ok=True)
+            header = {'topology': list(topology),
+                      'population': int(population),
+                      'n_params': genome_layout(tuple(topology)).n_params,
+                      'dtype': np.dtype(dtype).str,
+                      'generations': []}
+            self._write_header(header)
+
+        self.topology = header['topology']
+        self.population = header['population']
+        self.n_params = header['n_params']
+        self.dtype = np.dtype(header['dtype'])
+        self.generations = np.array(header['generations'], dtype=int)
+
+        self._maps = None
+
+    def _write_header(self, header):
+        tmp_path = join(self.directory, 'header.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, join(self.directory, 'header.json'))
+
+    def __len__(self):
+        return len(self.generations)
+
+    def append(self, generation: int, genomes: np.ndarray, fitnesses: np.ndarray) -> None:
+        if genomes.shape != (self.population, self.n_params):
+            raise ValueError(f'Expected genomes of shape {(self.population, self.n_params)}, got {genomes.shape}')
+
+        # Generations must increase for index lookups. Appending one that is not newer than the last, as when a run
+        # resumes from an older checkpoint, discards the generations from it onwards.
+        n = int(np.searchsorted(self.generations, generation))
+        if n < len(self):
+            # Shrink the header before the files so a crash never leaves it listing rows that are gone
+            self.generations = self.generations[:n]
+            self._write_header(self._header())
+        self._maps = None
+        for name, row, row_bytes in (('genomes.bin', genomes.astype(self.dtype), self._genome_bytes),
+                                     ('fitnesses.bin', fitnesses.astype(np.float64), self._fitness_bytes)):
+            with open(join(self.directory, name), 'ab') as f:
+                # Drop anything left over from an append that never reached the header
+                f.truncate(n * row_bytes)
+                f.write(np.ascontiguousarray(row).tobytes())
+
+        self.generations = np.append(self.generations, generation)
+        self._write_header(self._header())
+
+    def _header(self) -> dict:
+        return {'topology': self.topology,
+                'population': self.population,
+                'n_params': self.n_params,
+                'dtype': self.dtype.str,
+                'generations': self.generations.tolist()}
+
+    @property
+    def _genome_bytes(self):
+        return self.population * self.n_params * self.dtype.itemsize
+
+    @property
+    def _fitness_bytes(self):
+        return self.population * np.dtype(np.float64).itemsize
+
+    def _mapped(self) -> tuple[np.memmap, np.memmap]:
+        n = len(self)
+        if n == 0:
+            raise IndexError('The run archive is empty')
+        if self._maps is None or len(self._maps[0]) != n:
+            genomes = np.memmap(join(self.directory, 'genomes.bin'), self.dtype, 'r',
+                                shape=(n, self.population, self.n_params))
+            fitnesses = np.memmap(join(self.directory, 'fitnesses.bin'), np.float64, 'r', shape=(n, self.population))
+            self._maps = genomes, fitnesses
+        return self._maps
+
+    def refresh(self) -> None:
+        # Pick up generations appended by another process since this archive was opened
+        with open(join(self.directory, 'header.json')) as f:
+            self.generations = np.array(json.load(f)['generations'], dtype=int)
+
+    def index(self, generation: int) -> int:
+        i = int(np.searchsorted(self.generations, generation))
+        if i == len(self) or self.generations[i] != generation:
+            raise KeyError(f'Generation {generation} is not in the archive')
+        return i
+
+    def generation(self, generation: int) -> np.ndarray:
+        return self._mapped()[0][self.index(generation)]
+
+    def fitnesses(self, generation: int) -> np.ndarray:
+        return self._mapped()[1][self.index(generation)]
+
+    def fitness_history(self) -> np.ndarray:
+        return self._mapped()[1]
+
+    def best(self, generation: int) -> tuple[np.ndarray, float]:
+        i = self.index(generation)
+        genomes, fitnesses = self._mapped()
+        best = int(np.argmax(fitnesses[i]))
+        return np.array(genomes[i, best]), float(fitnesses[i, best])
+
+    def best_network(self, generation: int) -> Network:
+        genome, _ = self.best(generation)
+        return Network(self.topology, genome.astype(np.float64))
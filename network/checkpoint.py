@@ -0,0 +1,97 @@
+import atexit
+import json
+import os
+import queue
+import threading
+from os.path import join
+
+import numpy as np
+
+
+def write_checkpoint(filepath, data: dict, compress=True) -> None:
+    # Write to a temporary file first so a crash mid-write never leaves a truncated checkpoint behind
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        (np.savez_compressed if compress else np.savez)(f, **data)
+    os.replace(tmp_path, filepath)
+
+
+def read_checkpoint(filepath) -> dict:
+    with np.load(filepath) as f:
+        return {key: f[key] for key in f.files}
+
+
+class Checkpointer:
+
+    def __init__(self, directory, every=1, only_improved=False, dtype=None, compress=True, background=True):
+        self.directory = directory
+        self.every = every
+        self.only_improved = only_improved
+        self.dtype = dtype
+        self.compress = compress
+
+        self.best = -np.inf
+        self.error: BaseException | None = None
+
+        # Writes still queued when the interpreter exits are finished by the atexit flush, before the daemon
+        # writer thread is torn down
+        self._queue = None
+        if background:
+            self._queue = queue.Queue()
+            threading.Thread(target=self._write_loop, daemon=True).start()
+            atexit.register(self.flush)
+
+        os.makedirs(directory, exist_ok=True)
+
+    def should_save(self, generation, fitnesses) -> bool:
+        if generation % self.every != 0:
+            return False
+        if self.only_improved:
+            return fitnesses.size > 0 and fitnesses.max() > self.best
+        return True
+
+    def save(self, pool) -> str | None:
+        self._raise_error()
+        if not self.should_save(pool.generation, pool.fitnesses):
+            return None
+        self.best = max(self.best, pool.fitnesses.max(initial=-np.inf))
+
+        data = pool.checkpoint_data()
+        if self.dtype is not None:
+            data['genomes'] = data['genomes'].astype(self.dtype)
+
+        filepath = join(self.directory, f'gen_{pool.generation}.npz')
+        if self._queue is None:
+            write_checkpoint(filepath, data, self.compress)
+        else:
+            self._queue.put((filepath, data))
+        return filepath
+
+    def _write_loop(self):
+        while True:
+            filepath, data = self._queue.get()
+            try:
+                write_checkpoint(filepath, data, self.compress)
+            except Exception as e:
+                # Keep the writer alive so later saves and flush still complete; the error surfaces in the caller
+                self.error = self.error or e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self) -> None:
+        if self._queue is not None:
+            self._queue.join()
+        self._raise_error()
+
+
+def encode_rng_state(rng: np.random.Generator) -> np.ndarray:
+    return np.array(json.dumps(rng.bit_generator.state))
+
+
+def decode_rng_state(rng: np.random.Generator, state: np.ndarray) -> None:
+    rng.bit_generator.state = json.loads(str(state))
@@ -1,38 +1,83 @@
+from __future__ import annotations
+
 import numpy as np
-from typing import Sequence, Dict, Tuple
-from pygame import Rect
-from pgzero.screen import Screen
+from functools import lru_cache
+from typing import Sequence, Dict, Tuple, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from pgzero.screen import Screen
 
-class Network:
+
+class GenomeLayout:
 
     def __init__(self, layer_data: Sequence[int]):
+        self.layer_data = tuple(layer_data)
+        self.weight_shapes = [(j, i) for i, j in zip(layer_data, layer_data[1:])]
+        self.bias_shapes = [(j,) for j in layer_data[1:]]
+
+        self.weight_slices = []
+        self.bias_slices = []
+        offset = 0
+        for w_shape, b_shape in zip(self.weight_shapes, self.bias_shapes):
+            w_size, b_size = int(np.prod(w_shape)), int(np.prod(b_shape))
+            self.weight_slices.append(slice(offset, offset + w_size))
+            self.bias_slices.append(slice(offset + w_size, offset + w_size + b_size))
+            offset += w_size + b_size
+        self.n_params = offset
+
+    def weights(self, genomes: np.ndarray) -> list[np.ndarray]:
+        lead = genomes.shape[:-1]
+        return [genomes[..., s].reshape(lead + shape) for s, shape in zip(self.weight_slices, self.weight_shapes)]
+
+    def biases(self, genomes: np.ndarray) -> list[np.ndarray]:
+        lead = genomes.shape[:-1]
+        return [genomes[..., s].reshape(lead + shape) for s, shape in zip(self.bias_slices, self.bias_shapes)]
+
+    def random(self, n: int | None = None, dtype=np.float64, rng=np.random) -> np.ndarray:
+        shape = (self.n_params,) if n is None else (n, self.n_params)
+        return rng.standard_normal(shape).astype(dtype, copy=False)
+
+
+@lru_cache(maxsize=None)
+def genome_layout(layer_data: Tuple[int, ...]) -> GenomeLayout:
+    return GenomeLayout(layer_data)
+
+
+class Network:
+
+    def __init__(self, layer_data: Sequence[int], params: np.ndarray | None = None,
+                 activation='sigmoid', dtype=np.float32):
         self.layer_data = layer_data
-        self.layers = [np.zeros((i, 1)) for i in layer_data]
-        self.weights = [np.random.randn(j, i) for i, j in zip(layer_data, layer_data[1:])]
-        self.biases = [np.random.randn(i, 1) for i in layer_data[1:]]
+        self.layout = genome_layout(tuple(layer_data))
+        self.params = self.layout.random(dtype=dtype) if params is None else params
+        self.weights = self.layout.weights(self.params)
+        self.biases = self.layout.biases(self.params)
+        self.activation = activation
+        self.activate = activations[activation]
+
+        # Activations are only written to self.layers while recording (i.e. when a viewer is attached). Otherwise
+        # simulate ping-pongs between two preallocated scratch buffers.
+        self.record = False
+        self.layers = [np.zeros(i, dtype=self.params.dtype) for i in layer_data]
+        self._scratch = np.zeros((2, max(layer_data)), dtype=self.params.dtype)
 
         self.node_positions = self.calculate_node_positions()
 
     def simulate(self, input_data: Sequence[float]) -> np.ndarray:
-        self.layers[0] = np.matrix(input_data).transpose()
-        for i, weights in enumerate(self.weights):
-            self.layers[i + 1] = weights * self.layers[i] + self.biases[i]
-            self.layers[i + 1] = 1 / (1 + np.exp(-self.layers[i + 1]))
-
-        return self.layers[-1]
+        # The returned array is reused by the next call, copy it to keep it
+        x = np.asarray(input_data, dtype=self.params.dtype)
+        if self.record:
+            self.layers[0][:] = x
+        for i, (weights, biases) in enumerate(zip(self.weights, self.biases)):
+            out = self.layers[i + 1] if self.record else self._scratch[i % 2, :len(biases)]
+            np.matmul(weights, x, out=out)
+            out += biases
+            x = self.activate(out, out=out)
+
+        return x
 
     def mutate(self, mutation_rate):
-        for layer in self.layers:
-            layer_shape = layer.shape
-            modifications = (np.random.uniform(size=layer_shape) < mutation_rate) * np.random.normal(size=layer_shape)
-            layer += modifications
-
-        for bias in self.biases:
-            bias_shape = bias.shape
-            modifications = (np.random.uniform(size=bias_shape) < mutation_rate) * np.random.normal(size=bias_shape)
-            bias += modifications
-
+        mutate_params(self.params, mutation_rate)
         return self
 
     def calculate_node_positions(self) -> Dict[Tuple[int, int], Tuple[float, float]]:
@@ -48,26 +93,9 @@ class Network:
         return node_positions
 
     def draw(self, screen: Screen, x: float, y: float, w: float, h: float) -> None:
-        screen.draw.filled_rect(Rect(x, y, w, h), (255, 255, 255))
-
-        node_radius = min(min(map(lambda a: h / a, self.layer_data)), w / len(self.layer_data)) * 0.4
-
-        for i, weights in enumerate(self.weights):
-            rows, cols = weights.shape
-            for r in range(rows):
-                for c in range(cols):
-                    s_x, s_y = self.node_positions[(i, c)]
-                    e_x, e_y = self.node_positions[(i + 1, r)]
-                    colour_mod = min(255, abs(weights[r, c])/2 * 255)
-                    c = (255, colour_mod, colour_mod) if weights[r, c] < 0 else (colour_mod, 255, colour_mod)
-                    screen.draw.line((x + s_x * w, y + s_y * h), (x + e_x * w, y + e_y * h), c)
-
-        for i, n_nodes in enumerate(self.layer_data):
-            for n in range(n_nodes):
-                n_x, n_y = self.node_positions[(i, n)]
-                c = min(max(self.layers[i][n] * 255, 0), 255)
-                screen.draw.filled_circle((x + n_x * w, y + n_y * h), node_radius, (c, c, c))
-                screen.draw.circle((x + n_x * w, y + n_y * h), node_radius, (0, 0, 0))
+        # Rendering lives in network.render so that training code never imports pygame
+        from network.render import draw_network
+        draw_network(self, screen, x, y, w, h)
 
     def print(self) -> None:
         for i in range(len(self.layer_data)-1):
@@ -75,22 +103,88 @@ class Network:
             print(self.biases[i])
 
 
+def sigmoid(x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    out = np.negative(x, out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+
+def tanh(x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    return np.tanh(x, out=out)
+
+
+def relu(x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    return np.maximum(x, 0, out=out)
+
+
+activations = {
+    'sigmoid': sigmoid,
+    'tanh': tanh,
+    'relu': relu,
+}
+
+
+def simulate_batch(weights: Sequence[np.ndarray], biases: Sequence[np.ndarray],
+                   inputs: np.ndarray, alive: np.ndarray | None = None, activation='sigmoid') -> np.ndarray:
+    # weights: (pop, out, in), biases: (pop, out), inputs: (..., pop, in) where the leading axes are independent
+    # environments. Entries that are not alive are left at 0, and candidates dead everywhere are skipped.
+    x = np.asarray(inputs, dtype=weights[0].dtype)
+    if alive is not None:
+        alive = np.asarray(alive, dtype=bool)
+        active = alive.reshape(-1, alive.shape[-1]).any(axis=0)
+        out = np.zeros(x.shape[:-1] + (weights[-1].shape[-2],), dtype=x.dtype)
+        if active.any():
+            out[..., active, :] = simulate_batch([w[active] for w in weights], [b[active] for b in biases],
+                                                 x[..., active, :], activation=activation)
+            out[~alive] = 0
+        return out
+
+    activate = activations[activation]
+    for w, b in zip(weights, biases):
+        x = np.matmul(w, x[..., None])[..., 0]
+        x += b
+        activate(x, out=x)
+    return x
+
+
+def mutate_params(params: np.ndarray, mutation_rate: float, rng: np.random.Generator | None = None) -> np.ndarray:
+    # The gaps between mutated parameters are geometric, so only the mutated parameters cost a draw
+    rng = np.random.default_rng() if rng is None else rng
+    flat = params.reshape(-1)
+    if mutation_rate <= 0 or flat.size == 0:
+        return params
+
+    chunks, last = [], -1
+    while last < flat.size - 1:
+        expected = mutation_rate * (flat.size - 1 - last)
+        chunks.append(last + np.cumsum(rng.geometric(mutation_rate, int(expected + 4 * np.sqrt(expected)) + 16)))
+        last = chunks[-1][-1]
+    ix = np.concatenate(chunks)
+    ix = ix[:np.searchsorted(ix, flat.size)]
+
+    noise_dtype = params.dtype if params.dtype in (np.float32, np.float64) else np.float64
+    flat[ix] += rng.standard_normal(len(ix), dtype=noise_dtype)
+    if not np.may_share_memory(flat, params):
+        params[...] = flat.reshape(params.shape)
+    return params
+
+
+def crossover_params(a: np.ndarray, b: np.ndarray, a_bias=0.5, out: np.ndarray | None = None,
+                     rng: np.random.Generator | None = None) -> np.ndarray:
+    # a and b may be single genomes or (n, n_params) stacks, in which case a_bias can be one ratio per row
+    rng = np.random.default_rng() if rng is None else rng
+    mask = rng.random(a.shape, dtype=np.float32) < np.expand_dims(a_bias, -1).astype(np.float32)
+    if out is None:
+        return np.where(mask, a, b)
+    np.copyto(out, b)
+    np.putmask(out, mask, a)
+    return out
+
+
 def crossover(network_a: Network, network_b: Network, a_bias=0.5):
     if network_a.layer_data != network_b.layer_data:
         raise RuntimeError(f'Incompatible network topology: {network_a.layer_data} vs {network_b.layer_data}')
 
-    child = Network(network_a.layer_data)
-
-    for i, (a, b) in enumerate(zip(network_a.weights, network_b.weights)):
-        weights = b.copy()
-        mask = np.random.uniform(size=a.shape) < a_bias
-        weights[mask] = a[mask]
-        child.weights[i] = weights
-
-    for i, (a, b) in enumerate(zip(network_a.biases, network_b.biases)):
-        biases = b.copy()
-        mask = np.random.uniform(size=a.shape) < a_bias
-        biases[mask] = a[mask]
-        child.biases[i] = biases
-
-    return child
+    return Network(network_a.layer_data, crossover_params(network_a.params, network_b.params, a_bias),
+                   network_a.activation)
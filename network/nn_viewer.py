@@ -1,7 +1,8 @@
 import numpy as np
 import pgzero.keyboard
 
-from network import *
+# Run from the repository root with `python -m network.nn_viewer`
+from network.network import *
 # from pgzero import keyboard
 import pgzrun
 
@@ -11,6 +12,7 @@ WIDTH = 1080
 HEIGHT = 720
 
 network = Network([2, 2, 2])
+network.record = True
 
 mouse_pos = (0, 0)
 
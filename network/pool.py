@@ -1,10 +1,13 @@
-import pickle
+import contextlib
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 from network.network import *
+from network.checkpoint import Checkpointer, read_checkpoint, encode_rng_state, decode_rng_state
+from network.telemetry import Telemetry
 import numpy as np
-import pandas as pd
 import random
-from os.path import join
 
 
 def elite_selector(fitnesses):
@@ -24,16 +27,110 @@ def weighted_selector(fitnesses):
     return a, b, 0.5
 
 
+selectors = {
+    'elite': elite_selector,
+    'top_two': top_two_selector,
+    'weighted': weighted_selector,
+}
+
+
+def batch_elite_selector(fitnesses, n, rng):
+    best = np.full(n, np.argmax(fitnesses))
+    return best, best, 0.5
+
+
+def batch_top_two_selector(fitnesses, n, rng):
+    sorted_ix = np.argsort(fitnesses)
+    return np.full(n, sorted_ix[-1]), np.full(n, sorted_ix[-2]), 0.5
+
+
+def batch_weighted_selector(fitnesses, n, rng):
+    f_sq = fitnesses ** 2
+    total = np.sum(f_sq)
+    normalised = f_sq / total if total > 0 else None
+    a, b = rng.choice(fitnesses.size, size=(2, n), p=normalised)
+    return a, b, 0.5
+
+
+batch_selectors = {
+    elite_selector: batch_elite_selector,
+    top_two_selector: batch_top_two_selector,
+    weighted_selector: batch_weighted_selector,
+}
+
+
+def batched_selector(selector):
+    if selector in batch_selectors:
+        return batch_selectors[selector]
+    if selector in batch_selectors.values():
+        return selector
+
+    def batch_selector(fitnesses, n, rng):
+        a, b, ratio = zip(*(selector(fitnesses) for _ in range(n)))
+        return np.array(a), np.array(b), np.array(ratio)
+
+    return batch_selector
+
+
+def run_episode(layout: GenomeLayout, genomes: np.ndarray, env, max_ticks=None, activation='sigmoid',
+                on_tick=None) -> np.ndarray:
+    # on_tick(env, observations) is called before every step; returning True ends the episode early
+    weights, biases = layout.weights(genomes), layout.biases(genomes)
+    while not env.all_dead() and (max_ticks is None or env.time < max_ticks):
+        obs = env.read_env()
+        if on_tick is not None and on_tick(env, obs):
+            break
+        env.act(simulate_batch(weights, biases, obs, ~env.dead, activation))
+        env.update()
+    return env.fitness()
+
+
+_worker_genomes: shared_memory.SharedMemory | None = None
+_worker_env_factory = None
+
+
+def _init_worker(shm_name, env_factory):
+    global _worker_genomes, _worker_env_factory
+    _worker_genomes = shared_memory.SharedMemory(name=shm_name)
+    _worker_env_factory = env_factory
+
+
+def _evaluate_slice(shape, dtype, topology, activation, start, stop, seed, max_ticks):
+    genomes = np.ndarray(shape, dtype, buffer=_worker_genomes.buf)[start:stop]
+    env = _worker_env_factory(n_players=stop - start, seed=seed)
+    return run_episode(genome_layout(tuple(topology)), genomes, env, max_ticks, activation), env.time
+
+
+def _shutdown_workers(executor: ProcessPoolExecutor, shm: shared_memory.SharedMemory):
+    executor.shutdown()
+    shm.close()
+    shm.unlink()
+
+
+def load_checkpoint(filepath, **kwargs) -> 'Pool':
+    return Pool.from_checkpoint(filepath, **kwargs)
+
+
 class Pool:
 
     def __init__(self, population, topology,
                  crossover_selector=elite_selector,
                  mutation_rate=0.1,
                  carry_over=10,
-                 save_dir=None):
+                 save_dir=None,
+                 dtype=np.float32,
+                 activation='sigmoid',
+                 seed=None,
+                 checkpointer=None,
+                 archive=None,
+                 telemetry: Telemetry | None = None):
         self.population = population
+        self.topology = topology
+        self.layout = genome_layout(tuple(topology))
+        self.activation = activation
+        self.rng = np.random.default_rng(seed)
 
-        self.candidates = [Network(topology) for _ in range(population)]
+        self.genomes = self.layout.random(population, dtype, self.rng)
         self.fitnesses = np.zeros(population)
         self.generation = 0
 
@@ -41,28 +138,176 @@ class Pool:
         self.mutation_rate = mutation_rate
         self.carry_over = carry_over
         self.save_dir = save_dir
+        self.checkpointer = checkpointer
+        if checkpointer is None and save_dir is not None:
+            self.checkpointer = Checkpointer(save_dir, background=False)
+        self.archive = archive
+        self.telemetry = telemetry
 
-    def next_generation(self):
+        self.ticks = 0
+
+        self._candidates = None
+        self._workers = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_candidates'] = None
+        state['_workers'] = None
+        state['checkpointer'] = None
+        state['telemetry'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.checkpointer is not None:
+            self.checkpointer.flush()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        self._stop_workers()
+
+    @property
+    def candidates(self) -> list[Network]:
+        if self._candidates is None:
+            self._candidates = [Network(self.topology, row, self.activation) for row in self.genomes]
+        return self._candidates
+
+    def stacked_parameters(self) -> tuple[list[np.ndarray], list[np.ndarray]]:
+        return self.layout.weights(self.genomes), self.layout.biases(self.genomes)
+
+    def simulate_all(self, inputs: np.ndarray, alive: np.ndarray | None = None) -> np.ndarray:
+        weights, biases = self.stacked_parameters()
+        return simulate_batch(weights, biases, inputs, alive, self.activation)
+
+    def _phase(self, name):
+        if self.telemetry is None:
+            return contextlib.nullcontext()
+        return self.telemetry.phase(name, self.generation)
+
+    def play(self, env, max_ticks=None, scheduler=None) -> np.ndarray:
+        # scheduler, e.g. network.scheduler.SuccessiveHalving, decides how long each candidate gets to play
+        with self._phase('evaluate'):
+            if scheduler is not None:
+                fitnesses = scheduler.run(self.layout, self.genomes, env, max_ticks, self.activation)
+            else:
+                fitnesses = run_episode(self.layout, self.genomes, env, max_ticks, self.activation)
+            self.fitnesses = np.asarray(fitnesses, dtype=float)
+        self.ticks = env.time
+        return self.fitnesses
 
-        if self.save_dir is not None:
-            with open(join(self.save_dir, f'gen_{self.generation}'), 'wb+') as f:
-                pickle.dump(self, f)
+    def evaluate(self, env_factory, workers=None, max_ticks=None, scheduler=None) -> np.ndarray:
+        # env_factory(n_players=..., seed=...) must be picklable when workers > 1. Every slice of the population
+        # plays an environment built from the same seed, so results do not depend on the number of workers. A
+        # scheduler ranks candidates across the whole population, so it cannot be split over workers.
+        if scheduler is not None and workers is not None and workers > 1:
+            raise ValueError('A scheduler needs the whole population in one environment; use workers=1')
+        seed = int(self.rng.integers(2 ** 32))
+        if workers is None or workers <= 1:
+            return self.play(env_factory(n_players=self.population, seed=seed), max_ticks, scheduler)
+
+        with self._phase('evaluate'):
+            return self._evaluate_parallel(env_factory, workers, max_ticks, seed)
+
+    def _evaluate_parallel(self, env_factory, workers, max_ticks, seed) -> np.ndarray:
+        executor, shm = self._start_workers(workers, env_factory)
+        np.ndarray(self.genomes.shape, self.genomes.dtype, buffer=shm.buf)[:] = self.genomes
+
+        bounds = np.linspace(0, self.population, workers + 1).astype(int)
+        slices = [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+        futures = [executor.submit(_evaluate_slice, self.genomes.shape, self.genomes.dtype.str, tuple(self.topology),
+                                   self.activation, start, stop, seed, max_ticks)
+                   for start, stop in slices]
+
+        self.fitnesses = np.zeros(self.population)
+        self.ticks = 0
+        for (start, stop), future in zip(slices, futures):
+            fitnesses, ticks = future.result()
+            self.fitnesses[start:stop] = fitnesses
+            self.ticks = max(self.ticks, ticks)
+        return self.fitnesses
+
+    def _start_workers(self, workers, env_factory) -> tuple[ProcessPoolExecutor, shared_memory.SharedMemory]:
+        # The factory reaches each worker once, through the initializer, rather than with every slice
+        if self._workers is not None:
+            n_workers, factory, executor, shm, _ = self._workers
+            if n_workers == workers and factory is env_factory and shm.size >= self.genomes.nbytes:
+                return executor, shm
+            self._stop_workers()
+
+        shm = shared_memory.SharedMemory(create=True, size=self.genomes.nbytes)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, env_factory))
+        self._workers = workers, env_factory, executor, shm, weakref.finalize(self, _shutdown_workers, executor, shm)
+        return executor, shm
+
+    def _stop_workers(self):
+        if self._workers is not None:
+            self._workers[-1]()
+            self._workers = None
+
+    def checkpoint_data(self) -> dict:
+        selector_names = {selector: name for name, selector in selectors.items()}
+        return {
+            'genomes': self.genomes.copy(),
+            'fitnesses': self.fitnesses.copy(),
+            'generation': np.array(self.generation),
+            'rng_state': encode_rng_state(self.rng),
+            'topology': np.array(self.topology),
+            'mutation_rate': np.array(self.mutation_rate),
+            'carry_over': np.array(self.carry_over),
+            'selector': np.array(selector_names.get(self.crossover_selector, '')),
+            'dtype': np.array(self.genomes.dtype.str),
+            'activation': np.array(self.activation),
+        }
+
+    @classmethod
+    def from_checkpoint(cls, filepath, **kwargs) -> 'Pool':
+        # kwargs override the stored settings, e.g. a custom crossover_selector that could not be saved by name
+        data = read_checkpoint(filepath)
+        settings = dict(population=len(data['genomes']),
+                        topology=data['topology'].tolist(),
+                        crossover_selector=selectors.get(str(data['selector']), elite_selector),
+                        mutation_rate=float(data['mutation_rate']),
+                        carry_over=int(data['carry_over']),
+                        dtype=np.dtype(str(data['dtype'])),
+                        activation=str(data['activation']))
+        settings.update(kwargs)
+
+        pool = cls(**settings)
+        pool.genomes = data['genomes'].astype(pool.genomes.dtype)
+        pool.fitnesses = data['fitnesses'].astype(float)
+        pool.generation = int(data['generation'])
+        decode_rng_state(pool.rng, data['rng_state'])
+        return pool
+
+    def next_generation(self):
 
-        scores = pd.DataFrame(self.fitnesses)
-        print(f'--- Generation {self.generation} ---')
-        print(scores.describe())
-        print()
+        with self._phase('checkpoint'):
+            if self.checkpointer is not None:
+                self.checkpointer.save(self)
+            if self.archive is not None:
+                self.archive.append(self.generation, self.genomes, self.fitnesses)
 
-        old_candidates = self.candidates
+        old_genomes, old_fitnesses = self.genomes, self.fitnesses
+        self.genomes = np.empty_like(old_genomes)
 
-        def do_crossover():
-            a_ix, b_ix, ratio = self.crossover_selector(self.fitnesses)
-            return crossover(old_candidates[a_ix], old_candidates[b_ix], ratio)
+        n_children = self.population - self.carry_over
+        children = self.genomes[:n_children]
+        with self._phase('select'):
+            a_ix, b_ix, ratio = batched_selector(self.crossover_selector)(old_fitnesses, n_children, self.rng)
+            self.genomes[n_children:] = old_genomes[np.argsort(old_fitnesses)[::-1][:self.carry_over]]
+        with self._phase('crossover'):
+            crossover_params(old_genomes[a_ix], old_genomes[b_ix], ratio, out=children, rng=self.rng)
+        with self._phase('mutate'):
+            mutate_params(children, self.mutation_rate, self.rng)
 
-        self.candidates = [do_crossover().mutate(self.mutation_rate) for _ in range(self.population - self.carry_over)]
-        for i in np.argsort(self.fitnesses)[:self.carry_over:-1]:
-            self.candidates.append(old_candidates[i])
+        if self.telemetry is not None:
+            self.telemetry.record(self.generation, old_fitnesses, old_genomes, self.ticks)
 
         self.fitnesses = np.zeros(self.population)
+        self._candidates = None
 
         self.generation += 1
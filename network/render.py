@@ -0,0 +1,57 @@
+import weakref
+
+import numpy as np
+import pygame
+from pgzero.screen import Screen
+
+from network.network import Network
+
+# Network -> (size, params the graph was drawn from, surface)
+_weight_graphs = weakref.WeakKeyDictionary()
+
+
+def weight_colours(weights: np.ndarray) -> np.ndarray:
+    # (..., 3) colours: red for negative weights and green for positive, saturating at |w| = 2
+    mod = np.minimum(255, np.abs(weights) / 2 * 255).astype(int)
+    full = np.full_like(mod, 255)
+    return np.where((weights < 0)[..., None],
+                    np.stack([full, mod, mod], axis=-1),
+                    np.stack([mod, full, mod], axis=-1))
+
+
+def render_weight_graph(network: Network, w: int, h: int) -> pygame.Surface:
+    surface = pygame.Surface((w, h))
+    surface.fill((255, 255, 255))
+    for i, weights in enumerate(network.weights):
+        colours = weight_colours(weights).tolist()
+        rows, cols = weights.shape
+        for r in range(rows):
+            e_x, e_y = network.node_positions[(i + 1, r)]
+            for c in range(cols):
+                s_x, s_y = network.node_positions[(i, c)]
+                pygame.draw.line(surface, colours[r][c], (round(s_x * w), round(s_y * h)),
+                                 (round(e_x * w), round(e_y * h)))
+    return surface
+
+
+def weight_graph(network: Network, w: int, h: int) -> pygame.Surface:
+    # The weight graph only changes when the parameters do, so it is drawn once and reused until they differ
+    cached = _weight_graphs.get(network)
+    if cached is None or cached[0] != (w, h) or not np.array_equal(cached[1], network.params):
+        cached = (w, h), network.params.copy(), render_weight_graph(network, w, h)
+        _weight_graphs[network] = cached
+    return cached[2]
+
+
+def draw_network(network: Network, screen: Screen, x: float, y: float, w: float, h: float) -> None:
+    screen.blit(weight_graph(network, int(w), int(h)), (x, y))
+
+    node_radius = min(min(map(lambda a: h / a, network.layer_data)), w / len(network.layer_data)) * 0.4
+
+    for i, n_nodes in enumerate(network.layer_data):
+        shades = np.clip(network.layers[i] * 255, 0, 255).astype(int).tolist()
+        for n in range(n_nodes):
+            n_x, n_y = network.node_positions[(i, n)]
+            c = shades[n]
+            screen.draw.filled_circle((x + n_x * w, y + n_y * h), node_radius, (c, c, c))
+            screen.draw.circle((x + n_x * w, y + n_y * h), node_radius, (0, 0, 0))
@@ -0,0 +1,112 @@
+import math
+from typing import Callable
+
+import numpy as np
+
+from network.network import GenomeLayout
+from network.pool import run_episode
+
+
+def linear_extrapolation(fitness: np.ndarray, ticks: int, horizon: int) -> np.ndarray:
+    # Assumes a candidate cut off while still alive would have kept scoring at the same rate until the horizon
+    # That flatters slow starters when the environment gets harder later on, so it is not the default
+    return fitness * (horizon / max(ticks, 1))
+
+
+extrapolations = {
+    'none': None,
+    'linear': linear_extrapolation,
+}
+
+
+class SuccessiveHalving:
+    """Evaluates a population in rungs of growing tick budgets, retiring the weakest living candidates at each rung.
+
+    Rungs start at ``min_ticks`` and grow by ``eta``. Candidates are ranked by ``env.score()`` if the environment has
+    one, otherwise by ``env.fitness()``, and ties with the last one kept play on.
+    """
+
+    def __init__(self, min_ticks=250, eta=2.0, max_ticks=None, keep=None, min_keep=1,
+                 extrapolate: str | Callable = 'none'):
+        self.min_ticks = min_ticks
+        self.eta = eta
+        self.max_ticks = max_ticks
+        self.keep = 1 / eta if keep is None else keep
+        self.min_keep = min_keep
+        self.extrapolate = extrapolations[extrapolate] if isinstance(extrapolate, str) else extrapolate
+
+    def cap(self, max_ticks=None):
+        caps = [t for t in (self.max_ticks, max_ticks) if t is not None]
+        return min(caps) if caps else None
+
+    def budgets(self, max_ticks=None):
+        # Tick counts at which successive rungs end, unbounded if there is no cap
+        cap = self.cap(max_ticks)
+        budget = self.min_ticks
+        while cap is None or budget < cap:
+            yield int(budget)
+            budget *= self.eta
+
+    def run(self, layout: GenomeLayout, genomes: np.ndarray, env, max_ticks=None,
+            activation='sigmoid') -> np.ndarray:
+        n = len(genomes)
+        cap = self.cap(max_ticks)
+        rungs = self.budgets(max_ticks)
+        frozen = np.zeros(n, dtype=bool)
+        frozen_fitness = np.zeros(n)
+        retired_at = np.full(n, -1)
+        rung_ticks = []
+        rung_alive = []
+        next_rung = next(rungs, None)
+
+        def candidates_dead():
+            return np.asarray(env.dead).reshape(-1, n).all(axis=0)
+
+        def on_tick(env, obs):
+            nonlocal next_rung
+            if next_rung is None or env.time < next_rung:
+                return False
+            next_rung = next(rungs, None)
+
+            living = ~candidates_dead()
+            alive = np.flatnonzero(living)
+            n_keep = max(self.min_keep, math.ceil(len(alive) * self.keep))
+            if len(alive) <= n_keep:
+                return False
+
+            # Candidates tied with the last one kept are all kept, since a tie says nothing about who is better
+            scores = np.asarray(env.score() if hasattr(env, 'score') else env.fitness(), dtype=float)[alive]
+            threshold = np.partition(scores, len(alive) - n_keep)[len(alive) - n_keep]
+            retired = alive[scores < threshold]
+            if len(retired) == 0:
+                return False
+            frozen_fitness[retired] = np.asarray(env.fitness(), dtype=float)[retired]
+            frozen[retired] = True
+            retired_at[retired] = len(rung_ticks)
+            rung_ticks.append(env.time)
+            rung_alive.append(living)
+            env.dead[..., retired] = True
+            return False
+
+        fitness = np.array(run_episode(layout, genomes, env, cap, activation, on_tick=on_tick), dtype=float)
+        truncated = ~candidates_dead() & ~frozen
+        fitness[truncated] = self._extrapolated(fitness[truncated], env.time, cap)
+        fitness[frozen] = frozen_fitness[frozen]
+
+        if self.extrapolate is not None and cap is not None:
+            # An estimate may never overtake a candidate that played on past the rung, otherwise extrapolating
+            # survival time would score every retired candidate as if it had reached the cap. Candidates that had
+            # already died do not bound it. Later rungs are settled first so their final estimates are known.
+            for rung in range(len(rung_ticks) - 1, -1, -1):
+                cut = retired_at == rung
+                estimate = self._extrapolated(fitness[cut], rung_ticks[rung], cap)
+                later = rung_alive[rung] & ~cut
+                if later.any():
+                    estimate = np.minimum(estimate, np.nextafter(fitness[later].min(), -np.inf))
+                fitness[cut] = np.maximum(fitness[cut], estimate)
+        return fitness
+
+    def _extrapolated(self, fitness: np.ndarray, ticks, horizon) -> np.ndarray:
+        if self.extrapolate is None or horizon is None:
+            return fitness
+        return self.extrapolate(fitness, ticks, horizon)
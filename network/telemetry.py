@@ -0,0 +1,141 @@
+import contextlib
+import cProfile
+import csv
+import io
+import json
+import pstats
+import time
+
+import numpy as np
+
+phases = ('evaluate', 'select', 'crossover', 'mutate', 'checkpoint')
+
+
+def fitness_stats(fitnesses: np.ndarray, percentiles=(10, 25, 50, 75, 90)) -> dict:
+    values = np.percentile(fitnesses, percentiles)
+    stats = {'min': float(fitnesses.min()),
+             'max': float(fitnesses.max()),
+             'mean': float(fitnesses.mean()),
+             'std': float(fitnesses.std())}
+    stats.update({f'p{p:g}': float(v) for p, v in zip(percentiles, values)})
+    return stats
+
+
+def diversity(genomes: np.ndarray, sample: int | None = 1024) -> float:
+    # Mean per-parameter standard deviation across the population, estimated from an evenly strided sample of rows
+    if sample is not None and len(genomes) > sample:
+        genomes = genomes[::len(genomes) // sample]
+    return float(np.std(genomes, axis=0, dtype=np.float64).mean())
+
+
+class RowWriter:
+    """Buffers telemetry rows and appends them to a JSONL or CSV file, chosen by the file extension."""
+
+    def __init__(self, path, buffer_rows=50):
+        self.path = path
+        self.csv = str(path).endswith('.csv')
+        self.buffer_rows = buffer_rows
+        self._rows = []
+        self._fields = None
+        open(path, 'w').close()
+
+    def write(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        with open(self.path, 'a', newline='') as f:
+            if self.csv:
+                if self._fields is None:
+                    self._fields = list(self._rows[0])
+                    csv.writer(f).writerow(self._fields)
+                csv.DictWriter(f, self._fields, extrasaction='ignore').writerows(self._rows)
+            else:
+                f.writelines(json.dumps(row) + '\n' for row in self._rows)
+        self._rows = []
+
+
+class Telemetry:
+    """Per-generation fitness statistics and phase timings for a Pool.
+
+    Each call to record produces one row holding fitness min/max/mean/std and percentiles, best fitness so far,
+    genome diversity, tick count, wall time since the previous row, and seconds spent in each phase. Rows are
+    buffered to ``path`` (``.csv`` or JSONL) and, with ``echo``, summarised on stdout. If ``profile_generation`` is
+    set, that generation is run under cProfile, from its first timed phase until it is recorded. The stats go to
+    ``profile_path`` if given, otherwise the slowest calls are printed. Only the main process is profiled, so
+    worker-side evaluation shows up as time waiting on futures.
+    """
+
+    def __init__(self, path=None, echo=True, buffer_rows=50, percentiles=(10, 25, 50, 75, 90),
+                 diversity_sample: int | None = 1024, profile_generation: int | None = None, profile_path=None):
+        self.writer = RowWriter(path, buffer_rows) if path is not None else None
+        self.echo = echo
+        self.percentiles = percentiles
+        self.diversity_sample = diversity_sample
+        self.profile_generation = profile_generation
+        self.profile_path = profile_path
+
+        self.timings = dict.fromkeys(phases, 0.0)
+        self.best = -np.inf
+        self.rows = 0
+
+        self._last = time.perf_counter()
+        self._profiler = None
+
+    @contextlib.contextmanager
+    def phase(self, name, generation):
+        if generation == self.profile_generation and self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self, generation, fitnesses: np.ndarray, genomes: np.ndarray, ticks=0) -> dict:
+        now = time.perf_counter()
+        stats = fitness_stats(fitnesses, self.percentiles)
+        self.best = max(self.best, stats['max'])
+
+        row = {'generation': generation, 'ticks': ticks, 'wall_time': now - self._last}
+        row.update(stats)
+        row['best_so_far'] = self.best
+        row['diversity'] = diversity(genomes, self.diversity_sample)
+        row.update({f'{name}_time': seconds for name, seconds in self.timings.items()})
+
+        self.timings = dict.fromkeys(phases, 0.0)
+        self._last = now
+        self.rows += 1
+
+        if self.writer is not None:
+            self.writer.write(row)
+        if self.echo:
+            print(f'gen {generation}: best {stats["max"]:.3f} mean {stats["mean"]:.3f} median {stats["p50"]:.3f} '
+                  f'min {stats["min"]:.3f} | best so far {self.best:.3f} | diversity {row["diversity"]:.4f}')
+        if self._profiler is not None:
+            self._finish_profile()
+        return row
+
+    def _finish_profile(self):
+        self._profiler.disable()
+        if self.profile_path is not None:
+            self._profiler.dump_stats(self.profile_path)
+        else:
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(25)
+            print(out.getvalue())
+        self._profiler = None
+        self.profile_generation = None
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        if self._profiler is not None:
+            self._finish_profile()
+        self.flush()
@@ -0,0 +1,103 @@
+import argparse
+import functools
+import time
+
+from flappybird.vector_flappy import MultiFlappyGame
+from network.archive import RunArchive
+from network.pool import *
+from network.scheduler import SuccessiveHalving
+from network.telemetry import Telemetry
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train a Pool on headless Flappy Bird without rendering.')
+    parser.add_argument('--population', type=int, default=200)
+    parser.add_argument('--topology', type=int, nargs='+', default=[5, 5, 1])
+    parser.add_argument('--activation', choices=sorted(activations), default='sigmoid')
+    parser.add_argument('--selector', choices=sorted(selectors), default='weighted')
+    parser.add_argument('--mutation-rate', type=float, default=0.01)
+    parser.add_argument('--carry-over', type=int, default=1)
+    parser.add_argument('--generations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--envs', type=int, default=1, help='independent games averaged per candidate')
+    parser.add_argument('--max-ticks', type=int, default=None)
+    parser.add_argument('--halving-min-ticks', type=int, default=None,
+                        help='evaluate by successive halving, starting every candidate with this many ticks')
+    parser.add_argument('--halving-eta', type=float, default=2.0, help='budget growth and cut factor per rung')
+    parser.add_argument('--checkpoint-dir', default=None)
+    parser.add_argument('--checkpoint-every', type=int, default=1)
+    parser.add_argument('--checkpoint-only-improved', action='store_true')
+    parser.add_argument('--checkpoint-float16', action='store_true', help='quantise stored genomes to float16')
+    parser.add_argument('--checkpoint-uncompressed', action='store_true')
+    parser.add_argument('--archive-dir', default=None, help='append every generation to a memory-mapped run archive')
+    parser.add_argument('--telemetry', default=None,
+                        help='write per-generation stats and phase timings (.csv or .jsonl)')
+    parser.add_argument('--profile-generation', type=int, default=None, help='run this generation under cProfile')
+    parser.add_argument('--profile-path', default=None, help='dump profile stats here instead of printing them')
+    parser.add_argument('--width', type=int, default=1080)
+    parser.add_argument('--height', type=int, default=720)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.halving_min_ticks is not None and args.workers > 1:
+        raise SystemExit('--halving-min-ticks ranks the whole population at once and cannot be used with --workers')
+    if args.halving_min_ticks is not None and args.envs < 2:
+        raise SystemExit('--halving-min-ticks needs --envs 2 or more: in a single game every living bird ties')
+
+    checkpointer = None
+    if args.checkpoint_dir is not None:
+        checkpointer = Checkpointer(args.checkpoint_dir,
+                                    every=args.checkpoint_every,
+                                    only_improved=args.checkpoint_only_improved,
+                                    dtype=np.float16 if args.checkpoint_float16 else None,
+                                    compress=not args.checkpoint_uncompressed)
+
+    archive = None
+    if args.archive_dir is not None:
+        archive = RunArchive(args.archive_dir, args.topology, args.population)
+
+    telemetry = None
+    if args.telemetry is not None or args.profile_generation is not None:
+        telemetry = Telemetry(args.telemetry, echo=False, profile_generation=args.profile_generation,
+                              profile_path=args.profile_path)
+
+    scheduler = None
+    if args.halving_min_ticks is not None:
+        scheduler = SuccessiveHalving(args.halving_min_ticks, args.halving_eta)
+
+    env_factory = functools.partial(MultiFlappyGame, args.width, args.height, args.envs)
+
+    with Pool(population=args.population,
+              topology=args.topology,
+              activation=args.activation,
+              crossover_selector=selectors[args.selector],
+              mutation_rate=args.mutation_rate,
+              carry_over=args.carry_over,
+              seed=args.seed,
+              checkpointer=checkpointer,
+              archive=archive,
+              telemetry=telemetry) as pool:
+        total_ticks = 0
+        start = time.perf_counter()
+        for _ in range(args.generations):
+            gen_start = time.perf_counter()
+            fitnesses = pool.evaluate(env_factory, workers=args.workers, max_ticks=args.max_ticks,
+                                      scheduler=scheduler)
+            ticks = pool.ticks
+            pool.next_generation()
+            elapsed = time.perf_counter() - gen_start
+
+            total_ticks += ticks
+            print(f'gen {pool.generation - 1}: best {fitnesses.max():.1f} mean {fitnesses.mean():.1f} '
+                  f'| {1 / elapsed:.2f} gens/s {ticks / elapsed:.0f} ticks/s')
+
+        elapsed = time.perf_counter() - start
+        print(f'{args.generations} generations in {elapsed:.1f}s: '
+              f'{args.generations / elapsed:.2f} gens/s, {total_ticks / elapsed:.0f} ticks/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import numpy as np
+
+from network.pool import Pool, run_episode
+
+
+def _frozen(array) -> np.ndarray:
+    array = np.array(array, copy=True)
+    array.setflags(write=False)
+    return array
+
+
+class Snapshot:
+    """A read-only copy of a training run at one tick, as published by BackgroundTrainer.
+
+    ``state`` is whatever the environment's ``snapshot()`` returned. ``champion`` is the population row being
+    followed, and ``params`` and ``inputs`` are its genome and its observation on this tick.
+    """
+
+    def __init__(self, generation, tick, state: dict, champion, params, inputs, best_fitness):
+        self.generation = generation
+        self.tick = tick
+        self.state = {key: _frozen(value) for key, value in state.items()}
+        self.champion = champion
+        self.params = _frozen(params)
+        self.inputs = _frozen(inputs)
+        self.best_fitness = best_fitness
+
+
+class BackgroundTrainer:
+    """Evolves a Pool on a daemon thread, as fast as it can, independently of any render loop.
+
+    Every ``publish_interval`` seconds the trainer replaces ``snapshot`` with a fresh Snapshot. It is a single
+    reference swap, so readers never lock and never see a half-written state. They just draw whatever snapshot is
+    current. The trainer owns the pool while it runs; stop it before touching the pool from another thread.
+    """
+
+    def __init__(self, pool: Pool, env_factory, max_ticks=None, publish_interval=1 / 60):
+        self.pool = pool
+        self.env_factory = env_factory
+        self.max_ticks = max_ticks
+        self.publish_interval = publish_interval
+
+        self.snapshot: Snapshot | None = None
+        self.error: BaseException | None = None
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_publish = 0.0
+        self._best_fitness = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        pool = self.pool
+        try:
+            while not self._stop.is_set():
+                env = self.env_factory(n_players=pool.population, seed=int(pool.rng.integers(2 ** 32)))
+                fitnesses = run_episode(pool.layout, pool.genomes, env, self.max_ticks, pool.activation,
+                                        on_tick=self._on_tick)
+                if self._stop.is_set():
+                    break
+                pool.fitnesses = np.asarray(fitnesses, dtype=float)
+                pool.ticks = env.time
+                self._best_fitness = float(pool.fitnesses.max())
+                pool.next_generation()
+        except BaseException as e:
+            self.error = e
+
+    def _on_tick(self, env, inputs) -> bool:
+        now = time.perf_counter()
+        if now - self._last_publish >= self.publish_interval:
+            self._last_publish = now
+            self.publish(env, inputs)
+        return self._stop.is_set()
+
+    def publish(self, env, inputs):
+        # Follow the carried-over elite in the last row while it lives, otherwise the first bird still alive
+        dead = np.asarray(env.dead).reshape(-1, self.pool.population).all(axis=0)
+        champion = len(dead) - 1 if not dead[-1] else int(np.argmin(dead))
+        inputs = np.asarray(inputs).reshape(-1, self.pool.population, inputs.shape[-1])[0]
+        self.snapshot = Snapshot(self.pool.generation, env.time, env.snapshot(), champion,
+                                 self.pool.genomes[champion], inputs[champion], self._best_fitness)
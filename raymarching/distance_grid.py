@@ -0,0 +1,160 @@
+import json
+
+import numpy as np
+import numpy.typing as npt
+
+from raymarching.raymarch import SDF, march_many
+
+
+def sample_grid(sdf: SDF, origin: npt.ArrayLike, spacing: float, shape: tuple[int, int], tile: int = 256,
+                dtype=np.float32) -> np.ndarray:
+    # values[i, j] = sdf(origin + (i, j) * spacing), evaluated one tile x tile block at a time to bound memory
+    origin = np.asarray(origin, dtype=float)
+    values = np.empty(shape, dtype=dtype)
+    for i in range(0, shape[0], tile):
+        for j in range(0, shape[1], tile):
+            xs = origin[0] + np.arange(i, min(i + tile, shape[0])) * spacing
+            ys = origin[1] + np.arange(j, min(j + tile, shape[1])) * spacing
+            points = np.stack(np.meshgrid(xs, ys, indexing='ij'), axis=-1)
+            values[i:i + len(xs), j:j + len(ys)] = sdf.query_many(points)
+    return values
+
+
+class SampledSDF(SDF):
+    """Distance field baked onto a regular grid and read back with bilinear interpolation.
+
+    ``values[i, j]`` is the distance at ``origin + (i, j) * spacing``. If an exact field is attached it answers
+    queries outside the grid and, when ``band > 0``, queries whose interpolated distance is within ``band`` of the
+    surface. Without one, points outside the grid read the nearest edge sample.
+    """
+
+    def __init__(self, values: np.ndarray, origin: npt.ArrayLike, spacing: float, exact: SDF | None = None,
+                 band: float = 0.0):
+        self.values = values
+        self.origin = np.asarray(origin, dtype=float)
+        self.spacing = float(spacing)
+        self.exact = exact
+        self.band = band
+
+    @classmethod
+    def bake(cls, sdf: SDF, bounds: tuple[float, float, float, float], spacing: float = 1.0, band: float = 0.0,
+             keep_exact: bool = True) -> 'SampledSDF':
+        x0, y0, x1, y1 = bounds
+        shape = (int(np.floor((x1 - x0) / spacing)) + 1, int(np.floor((y1 - y0) / spacing)) + 1)
+        values = sample_grid(sdf, (x0, y0), spacing, shape)
+        return cls(values, (x0, y0), spacing, sdf if keep_exact else None, band)
+
+    def evaluate(self, points):
+        # Corners are gathered from the flattened grid and the bounds tested per column, which keeps the cost
+        # elementwise rather than in small-axis reductions and 2D fancy indexing
+        flat = points.reshape(-1, 2)
+        u = (flat - self.origin) / self.spacing
+        nx, ny = self.values.shape
+        ux, uy = u[:, 0], u[:, 1]
+        outside = (ux < 0) | (ux > nx - 1) | (uy < 0) | (uy > ny - 1)
+
+        ux, uy = np.clip(ux, 0, nx - 1), np.clip(uy, 0, ny - 1)
+        ix, iy = np.minimum(ux.astype(np.int64), nx - 2), np.minimum(uy.astype(np.int64), ny - 2)
+        fx, fy = ux - ix, uy - iy
+        index = ix * ny + iy
+        v = self.values.reshape(-1)
+        near = v[index] + (v[index + ny] - v[index]) * fx
+        far = v[index + 1] + (v[index + ny + 1] - v[index + 1]) * fx
+        result = near + (far - near) * fy
+
+        if self.exact is not None:
+            fallback = outside | (np.abs(result) < self.band)
+            if fallback.any():
+                result[fallback] = self.exact.query_many(flat[fallback])
+
+        return result.reshape(points.shape[:-1])
+
+    def save(self, filepath: str) -> None:
+        # Writes filepath.npy (memory-mappable values) and filepath.json (grid placement)
+        np.save(filepath + '.npy', self.values)
+        with open(filepath + '.json', 'w') as f:
+            json.dump({'origin': self.origin.tolist(), 'spacing': self.spacing, 'band': self.band}, f)
+
+    @classmethod
+    def load(cls, filepath: str, exact: SDF | None = None, mmap: bool = True) -> 'SampledSDF':
+        with open(filepath + '.json') as f:
+            meta = json.load(f)
+        values = np.load(filepath + '.npy', mmap_mode='r' if mmap else None)
+        return cls(values, meta['origin'], meta['spacing'], exact, meta['band'])
+
+
+class RayTable:
+    """Ray-march distances baked over a grid of origins and a ring of directions.
+
+    ``values[i, j, a]`` is the distance marched from ``origin + (i, j) * spacing`` along angle
+    ``a * 2 pi / n_angles``, capped at ``max_distance``. ``lookup`` interpolates linearly in both position and angle,
+    which is much cheaper than marching when the same static field is sensed every tick. Only origins where the
+    field is at most ``inside`` (plus a cell of margin) are marched; the others read 0.
+    """
+
+    def __init__(self, values: np.ndarray, origin: npt.ArrayLike, spacing: float, max_distance: float):
+        self.values = values
+        self.origin = np.asarray(origin, dtype=float)
+        self.spacing = float(spacing)
+        self.max_distance = float(max_distance)
+        self._pairs = None
+
+    @property
+    def n_angles(self) -> int:
+        return self.values.shape[-1]
+
+    @classmethod
+    def bake(cls, field: SDF, bounds: tuple[float, float, float, float], spacing: float = 4.0, n_angles: int = 128,
+             max_distance: float = 300.0, inside: float = 0.0, epsilon: float = 0.5, max_steps: int = 64,
+             chunk: int = 1 << 16) -> 'RayTable':
+        x0, y0, x1, y1 = bounds
+        shape = (int(np.floor((x1 - x0) / spacing)) + 1, int(np.floor((y1 - y0) / spacing)) + 1)
+        cells = np.flatnonzero(sample_grid(field, (x0, y0), spacing, shape) <= inside + spacing * np.sqrt(2))
+        origins = np.stack(np.unravel_index(cells, shape), axis=-1) * spacing + np.array([x0, y0])
+
+        angles = np.arange(n_angles) * (2 * np.pi / n_angles)
+        directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+        values = np.zeros(shape + (n_angles,), dtype=np.float32)
+        flat = values.reshape(-1, n_angles)
+        step = max(1, chunk // n_angles)
+        for i in range(0, len(cells), step):
+            o = np.repeat(origins[i:i + step], n_angles, axis=0)
+            d = np.tile(directions, (len(o) // n_angles, 1))
+            data = march_many(field, o, d, epsilon, max_distance, max_steps)
+            flat[cells[i:i + step]] = data.distance.reshape(-1, n_angles)
+        return cls(values, (x0, y0), spacing, max_distance)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pairs'] = None
+        return state
+
+    def lookup(self, origins: np.ndarray, angles: np.ndarray) -> np.ndarray:
+        # float32 distances for (N, 2) origins and (N, K) angles in radians. Gathers dominate, so each angle is
+        # stored next to its successor and fetched as one 8 byte item, and the per-ray maths stays in float32.
+        nx, ny, n_angles = self.values.shape
+        if self._pairs is None:
+            pairs = np.stack([self.values, np.roll(self.values, -1, axis=-1)], axis=-1)
+            self._pairs = pairs.astype(np.float32).view(np.uint64).reshape(-1)
+
+        u = np.clip((np.asarray(origins) - self.origin) / self.spacing, 0, [nx - 1, ny - 1])
+        i = np.minimum(u.astype(np.int64), [nx - 2, ny - 2])
+        f = (u - i).astype(np.float32)
+
+        a = np.asarray(angles, dtype=np.float32) * np.float32(n_angles / (2 * np.pi))
+        a -= np.floor(a * np.float32(1 / n_angles)) * n_angles
+        a0 = np.minimum(a.astype(np.int64), n_angles - 1)
+        fa = a - a0.astype(np.float32)
+        index = ((i[:, 0] * ny + i[:, 1]) * n_angles)[:, None] + a0
+
+        def corner(offset):
+            pair = np.take(self._pairs, index + offset).view(np.float32).reshape(a.shape + (2,))
+            return pair[..., 0] + (pair[..., 1] - pair[..., 0]) * fa
+
+        fx, fy = f[:, 0, None], f[:, 1, None]
+        near = corner(0)
+        near += (corner(ny * n_angles) - near) * fx
+        far = corner(n_angles)
+        far += (corner((ny + 1) * n_angles) - far) * fx
+        return near + (far - near) * fy
@@ -1,8 +1,11 @@
-import math
+from __future__ import annotations
+
+import functools
+from abc import ABC, abstractmethod
 
 import numpy as np
 import numpy.typing as npt
-from typing import Callable
+from typing import Callable, Sequence
 
 
 class RayMarchData:
@@ -12,107 +15,500 @@ class RayMarchData:
         self.hit_point = hit_point
 
 
-class SDF:
+class SDF(ABC):
+    """Immutable signed distance field node.
 
-    def __init__(self, sdf_function: Callable[[npt.ArrayLike], float]):
-        self.sdf_function = sdf_function
+    Primitives, transforms and combinators build a tree. ``compile`` flattens it into an equivalent plan where all
+    line segments, Beziers and circles under a union are evaluated as one batched NumPy call per primitive type.
+    With ``accelerate=True`` large groups of segments are put in a GridUnion so each query only evaluates the
+    segments that can be nearest.
+    """
 
-    def query(self, point: npt.ArrayLike):
-        return self.sdf_function(point)
+    @abstractmethod
+    def evaluate(self, points: np.ndarray) -> np.ndarray:
+        # Maps an (..., 2) array of points to an (...) array of distances
+        pass
 
-    def translate(self, x: float, y: float):
-        offset = np.array([x, y])
-        original_function = self.sdf_function
-        self.sdf_function = lambda p: original_function(p - offset)
-        return self
+    def query(self, point: npt.ArrayLike) -> float:
+        return float(self.evaluate(np.asarray(point, dtype=float)))
+
+    def query_many(self, points: npt.ArrayLike) -> np.ndarray:
+        points = np.asarray(points, dtype=float)
+        return np.broadcast_to(self.evaluate(points), points.shape[:-1])
+
+    def translate(self, x: float, y: float) -> SDF:
+        return Translate(self, (x, y))
 
     # TODO: Rotation of SDFs
     # def rotate(self, theta: float):
     #     return self
 
-    def round(self, r: float):
-        original_function = self.sdf_function
-        self.sdf_function = lambda p: original_function(p) - r
-        return self
+    def round(self, r: float) -> SDF:
+        return Round(self, r)
+
+    def annular(self, r: float) -> SDF:
+        return Annular(self, r)
+
+    def smooth_union(self, other: SDF, k: float) -> SDF:
+        return SmoothUnion(self, other, k)
 
-    def annular(self, r: float):
-        original_function = self.sdf_function
-        self.sdf_function = lambda p: abs(original_function(p)) - r
+    def __add__(self, other: SDF) -> SDF:
+        return union([self, other])
+
+    def __and__(self, other: SDF) -> SDF:
+        return Intersection([self, other])
+
+    def compile(self, accelerate=False) -> SDF:
+        plan = _Plan(accelerate)
+        plan.add(self, np.zeros(2), 0.0)
+        return plan.build()
+
+    def _compile_node(self, accelerate) -> SDF:
+        # Nodes that cannot be merged into a batched union compile their children and keep their own shape
         return self
 
-    def __add__(self, other):
-        return SDF(lambda p: min(self.query(p), other.query(p)))
 
+class FunctionSDF(SDF):
 
-def circle_sdf(radius: float) -> SDF:
-    return SDF(lambda p: np.linalg.norm(p) - radius)
+    def __init__(self, sdf_function: Callable[[np.ndarray], np.ndarray]):
+        self.sdf_function = sdf_function
 
+    def evaluate(self, points):
+        return self.sdf_function(points)
 
-def line_segment_sdf(start: tuple[float, float], end: tuple[float, float]) -> SDF:
-    a = np.array(start)
-    b = np.array(end)
 
-    def sdf(pos):
-        pa = pos - a
-        ba = b - a
-        h = np.clip(np.dot(pa, ba) / np.dot(ba, ba), 0, 1)
-        return np.linalg.norm(pa - ba * h)
+class Empty(SDF):
 
-    return SDF(sdf)
+    def evaluate(self, points):
+        return np.full(np.shape(points)[:-1], np.inf)
 
 
-def bezier_sdf(start: tuple[float, float], control: tuple[float, float], end: tuple[float, float]) -> SDF:
-    a1 = np.array(start)
-    b1 = np.array(control)
-    c1 = np.array(end)
-
-    def sdf(pos) -> float:
-        a2 = b1 - a1
-        b2 = a1 - 2 * b1 + c1
-        c2 = a2 * 2
-        d = a1 - pos
-        kk = 1 / np.dot(b2, b2)
-        kx = kk * np.dot(a2, b2)
-        ky = kk * (2 * np.dot(a2, a2) + np.dot(d, b2)) / 3
-        kz = kk * np.dot(d, a2)
-        p = ky - kx * kx
-        p3 = p * p * p
-        q = kx * (2 * kx * kx - 3 * ky) + kz
-        h = q * q + 4 * p3
-        if h >= 0:
-            h = math.sqrt(h)
-            x = (np.array([h, -h]) - q) / 2
-            uv = np.sign(x) * np.power(np.abs(x), 1 / 3)
-            t = min(max(uv[0] + uv[1] - kx, 0), 1)
-            res = np.square(d + (c2 + b2 * t) * t).sum()
+class Circle(SDF):
+
+    def __init__(self, radius: float, centre: tuple[float, float] = (0, 0)):
+        self.radius = radius
+        self.centre = np.array(centre, dtype=float)
+
+    def evaluate(self, points):
+        return np.linalg.norm(points - self.centre, axis=-1) - self.radius
+
+
+class LineSegment(SDF):
+
+    def __init__(self, start: tuple[float, float], end: tuple[float, float]):
+        self.start = np.array(start, dtype=float)
+        self.end = np.array(end, dtype=float)
+
+    def evaluate(self, points):
+        return _segment_distance(points, self.start, self.end)
+
+
+class QuadraticBezier(SDF):
+
+    def __init__(self, start: tuple[float, float], control: tuple[float, float], end: tuple[float, float]):
+        self.start = np.array(start, dtype=float)
+        self.control = np.array(control, dtype=float)
+        self.end = np.array(end, dtype=float)
+
+    def evaluate(self, points):
+        return _bezier_distance(points, self.start, self.control, self.end)
+
+
+class Translate(SDF):
+
+    def __init__(self, child: SDF, offset: tuple[float, float]):
+        self.child = child
+        self.offset = np.array(offset, dtype=float)
+
+    def evaluate(self, points):
+        return self.child.evaluate(points - self.offset)
+
+    def _compile_node(self, accelerate):
+        return Translate(self.child.compile(accelerate), self.offset)
+
+
+class Round(SDF):
+
+    def __init__(self, child: SDF, r: float):
+        self.child = child
+        self.r = r
+
+    def evaluate(self, points):
+        return self.child.evaluate(points) - self.r
+
+    def _compile_node(self, accelerate):
+        return Round(self.child.compile(accelerate), self.r)
+
+
+class Annular(SDF):
+
+    def __init__(self, child: SDF, r: float):
+        self.child = child
+        self.r = r
+
+    def evaluate(self, points):
+        return np.abs(self.child.evaluate(points)) - self.r
+
+    def _compile_node(self, accelerate):
+        return Annular(self.child.compile(accelerate), self.r)
+
+
+class Union(SDF):
+
+    def __init__(self, children: Sequence[SDF]):
+        self.children = tuple(children)
+
+    def evaluate(self, points):
+        return functools.reduce(np.minimum, (child.evaluate(points) for child in self.children))
+
+
+class Intersection(SDF):
+
+    def __init__(self, children: Sequence[SDF]):
+        self.children = tuple(children)
+
+    def evaluate(self, points):
+        return functools.reduce(np.maximum, (child.evaluate(points) for child in self.children))
+
+    def _compile_node(self, accelerate):
+        return Intersection([child.compile(accelerate) for child in self.children])
+
+
+class SmoothUnion(SDF):
+
+    def __init__(self, a: SDF, b: SDF, k: float):
+        self.a = a
+        self.b = b
+        self.k = k
+
+    def evaluate(self, points):
+        da, db = self.a.evaluate(points), self.b.evaluate(points)
+        h = np.clip(0.5 + 0.5 * (db - da) / self.k, 0, 1)
+        return db + (da - db) * h - self.k * h * (1 - h)
+
+    def _compile_node(self, accelerate):
+        return SmoothUnion(self.a.compile(accelerate), self.b.compile(accelerate), self.k)
+
+
+class LineBatch(SDF):
+    # Union of S line segments, each shrunk by its own rounding radius, evaluated as one (..., S) array op
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, rounding: np.ndarray):
+        self.starts = np.asarray(starts, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        self.rounding = np.asarray(rounding, dtype=float)
+
+    def evaluate(self, points):
+        return (_segment_distance(points[..., None, :], self.starts, self.ends) - self.rounding).min(axis=-1)
+
+
+class BezierBatch(SDF):
+
+    def __init__(self, starts: np.ndarray, controls: np.ndarray, ends: np.ndarray, rounding: np.ndarray):
+        self.starts = np.asarray(starts, dtype=float)
+        self.controls = np.asarray(controls, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        self.rounding = np.asarray(rounding, dtype=float)
+
+    def evaluate(self, points):
+        distances = _bezier_distance(points[..., None, :], self.starts, self.controls, self.ends)
+        return (distances - self.rounding).min(axis=-1)
+
+
+class CircleBatch(SDF):
+
+    def __init__(self, centres: np.ndarray, radii: np.ndarray):
+        self.centres = np.asarray(centres, dtype=float)
+        self.radii = np.asarray(radii, dtype=float)
+
+    def evaluate(self, points):
+        return (np.linalg.norm(points[..., None, :] - self.centres, axis=-1) - self.radii).min(axis=-1)
+
+
+class GridUnion(SDF):
+    """Union of line and Bezier segments accelerated by a uniform grid.
+
+    Every segment gets a bounding box from its control points (a quadratic Bezier lies inside the hull of its
+    control points). For each grid cell an upper bound on the nearest distance anywhere in the cell is the exact
+    distance at its centre plus half the cell diagonal. Segments whose box is further from the cell than that bound
+    can never be nearest inside the cell and are culled when the grid is built. A query then only
+    evaluates the surviving candidates of each point's cell. Points outside the grid fall back to every segment.
+    """
+    min_segments = 16
+
+    def __init__(self, lines: LineBatch | None, beziers: BezierBatch | None, cell_size: float | None = None,
+                 bounds: tuple[float, float, float, float] | None = None):
+        self.lines = lines
+        self.beziers = beziers
+
+        boxes, rounding = [], []
+        if lines is not None:
+            boxes.append(np.stack([np.minimum(lines.starts, lines.ends), np.maximum(lines.starts, lines.ends)], 1))
+            rounding.append(lines.rounding)
+        if beziers is not None:
+            pts = np.stack([beziers.starts, beziers.controls, beziers.ends], axis=1)
+            boxes.append(np.stack([pts.min(axis=1), pts.max(axis=1)], axis=1))
+            rounding.append(beziers.rounding)
+        boxes, rounding = np.concatenate(boxes), np.concatenate(rounding)
+
+        if bounds is None:
+            lo, hi = boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)
+            margin = 0.25 * (hi - lo).max()
+            bounds = (*(lo - margin), *(hi + margin))
+        x0, y0, x1, y1 = bounds
+        if cell_size is None:
+            cell_size = max(x1 - x0, y1 - y0) / np.clip(np.ceil(np.sqrt(16 * len(boxes))), 4, 256)
+        self.origin = np.array([x0, y0], dtype=float)
+        self.cell_size = float(cell_size)
+        self.shape = (int(np.ceil((x1 - x0) / cell_size)), int(np.ceil((y1 - y0) / cell_size)))
+
+        ix, iy = np.meshgrid(np.arange(self.shape[0]), np.arange(self.shape[1]), indexing='ij')
+        cell_lo = self.origin + np.stack([ix.ravel(), iy.ravel()], axis=-1) * self.cell_size
+        cell_hi = cell_lo + self.cell_size
+
+        # Any point of a cell is at most half a diagonal further from the nearest segment than the cell centre is
+        candidates = np.empty((len(cell_lo), len(boxes)), dtype=bool)
+        chunk = max(1, 2 ** 20 // len(boxes))
+        for start in range(0, len(cell_lo), chunk):
+            lo, hi = cell_lo[start:start + chunk], cell_hi[start:start + chunk]
+            upper = np.full(len(lo), np.inf)
+            for batch in (lines, beziers):
+                if batch is not None:
+                    upper = np.minimum(upper, batch.evaluate((lo + hi) / 2))
+            upper += self.cell_size * np.sqrt(0.5)
+
+            gap = np.maximum(0, np.maximum(boxes[None, :, 0] - hi[:, None], lo[:, None] - boxes[None, :, 1]))
+            lower = np.linalg.norm(gap, axis=-1) - rounding
+            candidates[start:start + chunk] = lower <= upper[:, None]
+
+        n_lines = 0 if lines is None else len(lines.starts)
+        self._line_cells = _CandidateTable(candidates[:, :n_lines])
+        self._bezier_cells = _CandidateTable(candidates[:, n_lines:])
+
+    def evaluate(self, points):
+        flat = points.reshape(-1, 2)
+        cell = np.floor((flat - self.origin) / self.cell_size).astype(int)
+        inside = np.all((cell >= 0) & (cell < self.shape), axis=-1)
+
+        result = np.full(len(flat), np.inf)
+        outside = ~inside
+        if outside.any():
+            for batch in (self.lines, self.beziers):
+                if batch is not None:
+                    result[outside] = np.minimum(result[outside], batch.evaluate(flat[outside]))
+
+        inside_ix = np.flatnonzero(inside)
+        cell_ix = cell[inside, 0] * self.shape[1] + cell[inside, 1]
+        if self.lines is not None:
+            self._line_cells.reduce(result, inside_ix, flat, cell_ix, lambda p, s: _segment_distance(
+                p, self.lines.starts[s], self.lines.ends[s]) - self.lines.rounding[s])
+        if self.beziers is not None:
+            self._bezier_cells.reduce(result, inside_ix, flat, cell_ix, lambda p, s: _bezier_distance(
+                p, self.beziers.starts[s], self.beziers.controls[s], self.beziers.ends[s]) - self.beziers.rounding[s])
+
+        return result.reshape(points.shape[:-1])
+
+
+class _CandidateTable:
+    # Candidate segments of every cell stored CSR-style. Cells are grouped by candidate count rounded up to a power
+    # of two so a query gathers fixed-width (points, width) blocks with little padding.
+
+    def __init__(self, candidates: np.ndarray):
+        self.counts = candidates.sum(axis=1)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        self.indices = np.nonzero(candidates)[1]
+        self.widths = np.where(self.counts > 0, 2 ** np.ceil(np.log2(np.maximum(self.counts, 1))), 0).astype(int)
+
+    def reduce(self, result, point_ix, points, cell_ix, distance):
+        widths = self.widths[cell_ix]
+        for width in np.unique(widths[widths > 0]):
+            group = widths == width
+            cells = cell_ix[group]
+            slots = np.arange(width)
+            valid = slots < self.counts[cells, None]
+            segments = self.indices[np.where(valid, self.offsets[cells, None] + slots, 0)]
+            d = np.where(valid, distance(points[point_ix[group], None, :], segments), np.inf).min(axis=1)
+            result[point_ix[group]] = np.minimum(result[point_ix[group]], d)
+
+
+class _Plan:
+    # Gathers the primitives reachable through unions, translations and roundings, pushing the transforms into
+    # the primitive parameters. Anything else is compiled on its own and kept as a separate term.
+
+    def __init__(self, accelerate=False):
+        self.accelerate = accelerate
+        self.lines = []
+        self.beziers = []
+        self.circles = []
+        self.others = []
+
+    def add(self, node: SDF, offset: np.ndarray, rounding: float):
+        if isinstance(node, Union):
+            for child in node.children:
+                self.add(child, offset, rounding)
+        elif isinstance(node, Translate):
+            self.add(node.child, offset + node.offset, rounding)
+        elif isinstance(node, Round):
+            self.add(node.child, offset, rounding + node.r)
+        elif isinstance(node, LineSegment):
+            self.lines.append((node.start + offset, node.end + offset, rounding))
+        elif isinstance(node, QuadraticBezier):
+            self.beziers.append((node.start + offset, node.control + offset, node.end + offset, rounding))
+        elif isinstance(node, Circle):
+            self.circles.append((node.centre + offset, node.radius + rounding))
+        elif isinstance(node, LineBatch):
+            self.lines.extend(zip(node.starts + offset, node.ends + offset, node.rounding + rounding))
+        elif isinstance(node, BezierBatch):
+            self.beziers.extend(zip(node.starts + offset, node.controls + offset, node.ends + offset,
+                                    node.rounding + rounding))
+        elif isinstance(node, GridUnion):
+            for batch in (node.lines, node.beziers):
+                if batch is not None:
+                    self.add(batch, offset, rounding)
+        elif isinstance(node, CircleBatch):
+            self.circles.extend(zip(node.centres + offset, node.radii + rounding))
+        elif not isinstance(node, Empty):
+            term = node._compile_node(self.accelerate)
+            if np.any(offset != 0):
+                term = Translate(term, offset)
+            if rounding != 0:
+                term = Round(term, rounding)
+            self.others.append(term)
+
+    def build(self) -> SDF:
+        terms = []
+        lines = LineBatch(*map(np.array, zip(*self.lines))) if self.lines else None
+        beziers = BezierBatch(*map(np.array, zip(*self.beziers))) if self.beziers else None
+        if self.accelerate and len(self.lines) + len(self.beziers) >= GridUnion.min_segments:
+            terms.append(GridUnion(lines, beziers))
         else:
-            z = math.sqrt(-p)
-            v = math.acos(q / (p * z * 2)) / 3
-            m = math.cos(v)
-            n = math.sin(v) * 1.732050808
-            t = np.clip(np.array([m + m, -n - m, n - m]), 0, 1)
-            res = min(np.square(d + (c2 + b2 * t[0]) * t[0]).sum(), np.square(d + (c2 + b2 * t[1]) * t[1]).sum())
+            terms.extend(batch for batch in (lines, beziers) if batch is not None)
+        if self.circles:
+            terms.append(CircleBatch(*map(np.array, zip(*self.circles))))
+        terms.extend(self.others)
+
+        if len(terms) == 0:
+            return Empty()
+        if len(terms) == 1:
+            return terms[0]
+        return Union(terms)
+
+
+def _segment_distance(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    pa = points - a
+    ba = b - a
+    h = np.clip((pa * ba).sum(axis=-1) / (ba * ba).sum(axis=-1), 0, 1)
+    return np.linalg.norm(pa - ba * h[..., None], axis=-1)
+
+
+def _bezier_distance(points: np.ndarray, a1: np.ndarray, b1: np.ndarray, c1: np.ndarray) -> np.ndarray:
+    # Exact distance to a quadratic Bezier by solving the cubic for the closest t. Both root cases are evaluated
+    # and selected per point, so points and control points broadcast like any other array op. A curve whose control
+    # point sits on the chord midpoint is a straight line, where the cubic degenerates, so it uses the segment distance.
+    def dot(u, v):
+        return (u * v).sum(axis=-1)
+
+    a2 = b1 - a1
+    b2 = a1 - 2 * b1 + c1
+    c2 = a2 * 2
+    bb = dot(b2, b2)
+    straight = bb <= 1e-9 * dot(c1 - a1, c1 - a1)
+    kk = 1 / np.where(straight, 1, bb)
+    kx = kk * dot(a2, b2)
+
+    def sq_dist(d, t):
+        t = t[..., None]
+        return np.square(d + (c2 + b2 * t) * t).sum(axis=-1)
+
+    d = a1 - points
+    ky = kk * (2 * dot(a2, a2) + dot(d, b2)) / 3
+    kz = kk * dot(d, a2)
+    p = ky - kx * kx
+    p3 = p * p * p
+    q = kx * (2 * kx * kx - 3 * ky) + kz
+    h = q * q + 4 * p3
+    one_root = h >= 0
+
+    # One real root, where h >= 0
+    sqrt_h = np.sqrt(np.where(one_root, h, 0))
+    x = (np.stack([sqrt_h, -sqrt_h], axis=-1) - q[..., None]) / 2
+    uv = np.sign(x) * np.power(np.abs(x), 1 / 3)
+    res_one = sq_dist(d, np.clip(uv[..., 0] + uv[..., 1] - kx, 0, 1))
+
+    # Three real roots, where h < 0 (which implies p < 0)
+    z = np.sqrt(np.where(one_root, 1, -p))
+    v = np.arccos(np.clip(np.where(one_root, 0, q) / np.where(one_root, 1, p * z * 2), -1, 1)) / 3
+    m = np.cos(v)
+    n = np.sin(v) * 1.732050808
+    res_three = np.minimum(sq_dist(d, np.clip((m + m) * z - kx, 0, 1)), sq_dist(d, np.clip((-n - m) * z - kx, 0, 1)))
 
-        return math.sqrt(res)
+    curved = np.sqrt(np.where(one_root, res_one, res_three))
+    if not np.any(straight):
+        return curved
+    return np.where(straight, _segment_distance(points, a1, c1), curved)
 
-    return SDF(sdf)
+
+def union(sdfs: Sequence[SDF]) -> SDF:
+    children = []
+    for sdf in sdfs:
+        children.extend(sdf.children if isinstance(sdf, Union) else [sdf])
+    return Union(children)
+
+
+def circle_sdf(radius: float) -> SDF:
+    return Circle(radius)
+
+
+def line_segment_sdf(start: tuple[float, float], end: tuple[float, float]) -> SDF:
+    return LineSegment(start, end)
+
+
+def bezier_sdf(start: tuple[float, float], control: tuple[float, float], end: tuple[float, float]) -> SDF:
+    return QuadraticBezier(start, control, end)
 
 
 def id_sdf() -> SDF:
-    return SDF(lambda _: float('inf'))
+    return Empty()
 
 
 def march(field: SDF, point: npt.ArrayLike, direction: npt.ArrayLike,
-          epsilon: float = 1e-5, max_distance: float = 1000) -> RayMarchData:
+          epsilon: float = 1e-5, max_distance: float = 1000, max_steps: int = 256) -> RayMarchData:
     distance: float = 0
     mag = np.linalg.norm(direction)
     if mag == 0:
         return RayMarchData(max_distance, point)
     direction = direction / mag
     sample = abs(field.query(point + distance * direction))
-    while sample > epsilon and distance < max_distance:
+    steps = 0
+    while sample > epsilon and distance < max_distance and steps < max_steps:
         distance += sample
         sample = abs(field.query(point + distance * direction))
+        steps += 1
 
     distance = min(distance, max_distance)
     return RayMarchData(distance, point + distance * direction)
+
+
+def march_many(field: SDF, origins: npt.ArrayLike, directions: npt.ArrayLike,
+               epsilon: float = 1e-5, max_distance: float = 1000, max_steps: int = 256) -> RayMarchData:
+    # Marches N rays at once. Each step queries the field only for rays that have neither converged nor left
+    # max_distance. Returns RayMarchData holding an (N,) distance array and an (N, 2) hit point array.
+    origins = np.asarray(origins, dtype=float)
+    directions = np.asarray(directions, dtype=float)
+    mag = np.linalg.norm(directions, axis=-1)
+    still = mag == 0
+    directions = directions / np.where(still, 1, mag)[:, None]
+
+    distance = np.zeros(len(origins))
+    active = np.flatnonzero(~still)
+    for _ in range(max_steps):
+        if active.size == 0:
+            break
+        sample = np.abs(field.query_many(origins[active] + distance[active, None] * directions[active]))
+        moving = sample > epsilon
+        distance[active] += np.where(moving, sample, 0)
+        active = active[moving & (distance[active] < max_distance)]
+
+    distance = np.minimum(distance, max_distance)
+    distance[still] = max_distance
+    return RayMarchData(distance, origins + distance[:, None] * directions)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from network.archive import RunArchive
+
+
+def rows(generation: int) -> tuple[np.ndarray, np.ndarray]:
+    return np.full((4, 13), generation, dtype=np.float32), np.arange(4) + generation * 10.0
+
+
+def test_appending_an_older_generation_truncates(tmp_path):
+    archive = RunArchive(str(tmp_path), topology=[2, 3, 1], population=4)
+    for generation in range(5):
+        archive.append(generation, *rows(generation))
+
+    archive.append(2, *rows(20))
+    assert archive.generations.tolist() == [0, 1, 2]
+    np.testing.assert_array_equal(archive.generation(2), rows(20)[0])
+    with pytest.raises(KeyError):
+        archive.fitnesses(3)
+
+    archive.append(3, *rows(3))
+    reopened = RunArchive(str(tmp_path))
+    assert reopened.generations.tolist() == [0, 1, 2, 3]
+    np.testing.assert_array_equal(reopened.fitness_history(), [rows(g)[1] for g in (0, 1, 20, 3)])
@@ -0,0 +1,55 @@
+import functools
+
+import numpy as np
+import pytest
+
+from cars.car import CarEnv
+from cars.track import Bezier, Line, TrackBuilder
+from network.pool import Pool
+
+
+@pytest.fixture(scope='module')
+def track():
+    segments = [Line((100, 100), (400, 100)), Bezier((400, 100), (500, 180), (400, 260)),
+                Line((400, 260), (100, 260)), Bezier((100, 260), (0, 180), (100, 100))]
+    return TrackBuilder(segments, 540, 360, 20).make_track()
+
+
+def test_evaluation_does_not_depend_on_worker_count(track):
+    env_factory = functools.partial(CarEnv, track, start_jitter=0.3)
+    fitnesses = []
+    for workers in (1, 2):
+        with Pool(population=24, topology=[8, 6, 2], seed=0) as pool:
+            fitnesses.append(pool.evaluate(env_factory, workers=workers, max_ticks=150))
+    assert fitnesses[0].max() > 0
+    np.testing.assert_array_equal(fitnesses[0], fitnesses[1])
+
+
+def test_read_env_when_every_car_is_dead(track):
+    env = CarEnv(track, n_players=3, seed=0)
+    env.dead[:] = True
+    assert env.read_env().shape == (3, 8)
+
+
+def test_baked_sensors_and_progress_match_exact(track):
+    env = CarEnv(track, n_players=200, seed=0, start_jitter=0.3)
+    gain = np.random.default_rng(0).uniform(2, 10, env.n_players)
+    for _ in range(150):
+        obs = env.read_env()
+        env.act(np.stack([np.clip(0.5 + gain * (obs[:, -2] - obs[:, 0]), 0, 1), np.full(env.n_players, 0.6)], 1))
+        env.update()
+    alive = np.flatnonzero(~env.dead)
+    assert len(alive) > 0
+
+    angles = env.heading[alive, None] + env.sensor_angles
+    origins = np.repeat(env.pos[alive], angles.shape[1], axis=0)
+    directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1).reshape(-1, 2)
+    marched = track.march(origins, directions, epsilon=0.5, max_distance=env.sensor_range, max_steps=32).distance
+    error = np.abs(env.sense(alive) - marched.reshape(angles.shape))
+    assert error.mean() < 1 and np.median(error) < 0.5
+
+    centreline = track.centreline
+    arc = centreline.interpolate(env.pos[alive], env.progress[alive])
+    projected, _ = centreline.project_near(env.pos[alive], env.progress[alive])
+    wrapped = np.mod(arc - projected + centreline.length / 2, centreline.length) - centreline.length / 2
+    np.testing.assert_allclose(wrapped, 0, atol=2.5)
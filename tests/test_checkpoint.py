@@ -0,0 +1,50 @@
+import functools
+import os
+
+import numpy as np
+import pytest
+
+from flappybird.vector_flappy import VectorFlappyGame
+from network.checkpoint import Checkpointer
+from network.pool import Pool, load_checkpoint
+
+
+def test_checkpoint_resume_is_identical(tmp_path):
+    env_factory = functools.partial(VectorFlappyGame, 400, 300)
+    pool = Pool(population=40, topology=[5, 4, 1], carry_over=2, seed=0, save_dir=str(tmp_path))
+
+    genomes = {}
+    for _ in range(4):
+        pool.evaluate(env_factory, max_ticks=300)
+        pool.next_generation()
+        genomes[pool.generation] = pool.genomes.copy()
+    pool.close()
+
+    resumed = load_checkpoint(str(tmp_path / 'gen_1.npz'))
+    resumed.next_generation()
+    np.testing.assert_array_equal(resumed.genomes, genomes[2])
+    for generation in range(3, 5):
+        resumed.evaluate(env_factory, max_ticks=300)
+        resumed.next_generation()
+        np.testing.assert_array_equal(resumed.genomes, genomes[generation])
+
+
+def test_background_writes_finish_on_flush(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path), background=True)
+    pool = Pool(population=10, topology=[5, 1], seed=0, checkpointer=checkpointer)
+    for _ in range(3):
+        pool.next_generation()
+    checkpointer.flush()
+    assert sorted(os.listdir(tmp_path)) == ['gen_0.npz', 'gen_1.npz', 'gen_2.npz']
+
+
+def test_failed_background_write_is_raised(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path), background=True)
+    pool = Pool(population=10, topology=[5, 1], seed=0, checkpointer=checkpointer)
+    os.mkdir(tmp_path / 'gen_0.npz.tmp')
+    pool.next_generation()
+    with pytest.raises(OSError):
+        checkpointer.flush()
+    pool.next_generation()
+    checkpointer.flush()
+    assert os.path.exists(tmp_path / 'gen_1.npz')
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from raymarching import raymarch
+
+
+def sampled_bezier_distance(points: np.ndarray, a, b, c, samples: int = 4001) -> np.ndarray:
+    t = np.linspace(0, 1, samples)[:, None]
+    a, b, c = (np.asarray(p, dtype=float) for p in (a, b, c))
+    curve = (1 - t) ** 2 * a + 2 * (1 - t) * t * b + t ** 2 * c
+    return np.sqrt(np.square(points[:, None] - curve).sum(axis=-1)).min(axis=1)
+
+
+def random_segments(rng: np.random.Generator, n: int) -> list[raymarch.SDF]:
+    segments = []
+    for i in range(n):
+        start = rng.uniform(0, 500, 2)
+        end = start + rng.uniform(-60, 60, 2)
+        if i % 3 == 0:
+            segments.append(raymarch.line_segment_sdf(tuple(start), tuple(end)))
+        else:
+            control = (start + end) / 2 if i % 3 == 1 else start + rng.uniform(-60, 60, 2)
+            segments.append(raymarch.bezier_sdf(tuple(start), tuple(control), tuple(end)))
+    return segments
+
+
+@pytest.mark.parametrize('a, b, c', [((800, 200), (1000, 360), (800, 520)),
+                                     ((0, 0), (120, 0), (120, 60)),
+                                     ((0, 0), (30, 5), (100, 0)),
+                                     ((100, 0), (150, 0), (200, 0))])
+def test_bezier_matches_sampled_curve(a, b, c):
+    corners = np.array([a, b, c])
+    points = np.random.default_rng(0).uniform(corners.min(axis=0) - 100, corners.max(axis=0) + 100, (1000, 2))
+    np.testing.assert_allclose(raymarch.bezier_sdf(a, b, c).query_many(points),
+                               sampled_bezier_distance(points, a, b, c), atol=0.1)
+
+
+def test_grid_union_matches_union():
+    rng = np.random.default_rng(0)
+    union = raymarch.union(random_segments(rng, 60))
+    grid = union.compile(accelerate=True)
+    assert isinstance(grid, raymarch.GridUnion)
+
+    points = rng.uniform(-100, 600, (5000, 2))
+    expected = union.evaluate(points)
+    assert np.isfinite(expected).all()
+    np.testing.assert_allclose(grid.query_many(points), expected, rtol=1e-9, atol=1e-9)
+
+
+def test_march_many_matches_march():
+    rng = np.random.default_rng(2)
+    field = raymarch.union(random_segments(rng, 30)).round(3).compile(accelerate=True)
+    origins = rng.uniform(0, 500, (300, 2))
+    angles = rng.uniform(0, 2 * np.pi, 300)
+    directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1) * rng.uniform(0.5, 2, (300, 1))
+    directions[0] = 0
+
+    batch = raymarch.march_many(field, origins, directions, epsilon=0.1, max_distance=400, max_steps=64)
+    for i in range(len(origins)):
+        single = raymarch.march(field, origins[i], directions[i], epsilon=0.1, max_distance=400, max_steps=64)
+        assert batch.distance[i] == pytest.approx(single.distance, abs=1e-9)
+        np.testing.assert_allclose(batch.hit_point[i], single.hit_point, atol=1e-9)
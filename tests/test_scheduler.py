@@ -0,0 +1,61 @@
+import numpy as np
+
+from network.network import genome_layout
+from network.scheduler import SuccessiveHalving
+
+
+class RateEnv:
+    # Candidate i scores rates[i] per tick until it dies at death[i], ignoring its network's outputs
+
+    def __init__(self, rates, death):
+        self.rates = np.asarray(rates, dtype=float)
+        self.death = np.asarray(death)
+        self.dead = np.zeros(len(self.rates), dtype=bool)
+        self.scores = np.zeros(len(self.rates))
+        self.time = 0
+
+    def read_env(self):
+        return np.zeros((len(self.rates), 1))
+
+    def act(self, outputs):
+        pass
+
+    def update(self):
+        self.scores[~self.dead] += self.rates[~self.dead]
+        self.time += 1
+        self.dead |= self.time >= self.death
+
+    def all_dead(self):
+        return bool(self.dead.all())
+
+    def fitness(self):
+        return self.scores.copy()
+
+
+def run(extrapolate, rates, death, max_ticks=80):
+    layout = genome_layout((1, 1))
+    genomes = layout.random(len(rates))
+    halving = SuccessiveHalving(min_ticks=10, eta=2.0, extrapolate=extrapolate)
+    return halving.run(layout, genomes, RateEnv(rates, death), max_ticks)
+
+
+def test_retires_the_weakest_and_keeps_ties():
+    rates = [1, 2, 3, 4, 4, 5, 6, 7]
+    fitness = run('none', rates, np.full(8, 1000))
+    # Rungs end at 10, 20 and 40 ticks with half of the living candidates kept each time
+    np.testing.assert_array_equal(fitness, [10, 20, 30, 40 * 2, 40 * 2, 5 * 40, 6 * 80, 7 * 80])
+
+
+def test_extrapolation_stays_below_candidates_that_played_on():
+    rates = [1, 2, 3, 4, 5, 6, 7, 1]
+    death = np.full(8, 1000)
+    death[-1] = 5
+    none = run('none', rates, death)
+    linear = run('linear', rates, death)
+
+    # The early death of the last candidate does not bound the others
+    assert not np.array_equal(linear, none)
+    assert linear[-1] == none[-1] == 5
+    assert np.all(linear >= none)
+    survivors = linear[[5, 6]]
+    assert np.all(linear[:5] < survivors.min())
@@ -0,0 +1,42 @@
+import numpy as np
+
+from cars.track import Bezier, Centreline, Line, classify_distances, generate_image, track_palette
+from raymarching import raymarch
+
+segments = [Line((40, 40), (160, 40)), Bezier((160, 40), (200, 70), (160, 100)),
+            Line((160, 100), (40, 100)), Bezier((40, 100), (0, 70), (40, 40))]
+
+
+def test_generate_image_matches_per_pixel_classification():
+    track_width = 12
+    sdf = raymarch.union([segment.sdf for segment in segments]).annular(track_width).compile(accelerate=True)
+    width, height = 210, 150
+
+    pixels = np.stack(np.meshgrid(np.arange(width), np.arange(height), indexing='ij'), axis=-1)
+    expected = track_palette[classify_distances(sdf.query_many(pixels), track_width)]
+    np.testing.assert_array_equal(generate_image(width, height, sdf, track_width, tile=64), expected)
+
+
+def test_windowed_projection_matches_full_projection():
+    centreline = Centreline.from_segments(segments)
+    # Two laps along the centreline at 2 px a step, weaving up to 10 px either side of it
+    t = np.arange(0, 2 * centreline.length, 2.0)
+    arc = np.mod(t, centreline.length)
+    edge = np.searchsorted(centreline.arc, arc, side='right') - 1
+    along = (arc - centreline.arc[edge]) / centreline.lengths[edge]
+    points = centreline.starts[edge] + centreline.edges[edge] * along[:, None]
+    normals = np.stack([-centreline.edges[edge, 1], centreline.edges[edge, 0]], axis=-1)
+    normals /= centreline.lengths[edge, None]
+    points += normals * 10 * np.sin(t / 15)[:, None]
+
+    def lap_offset(a, b):
+        return np.mod(a - b + centreline.length / 2, centreline.length) - centreline.length / 2
+
+    full, _ = centreline.project(points)
+    progress = np.zeros(1)
+    for i, point in enumerate(points):
+        near, _ = centreline.project_near(point[None], progress)
+        assert abs(lap_offset(near[0], full[i])) < 1e-9
+        progress = centreline.advance(progress, point[None])
+    # Progress keeps counting across the start line
+    assert abs(progress[0] - t[-1]) < 15
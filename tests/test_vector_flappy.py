@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from flappybird.vector_flappy import VectorFlappyGame
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_vector_flappy_matches_flappy_game(seed):
+    flappy_bird = pytest.importorskip('flappybird.flappy_bird')
+    n_players = 32
+    game = flappy_bird.FlappyGame(400, 300, n_players, seed=seed)
+    vector = VectorFlappyGame(400, 300, n_players, seed=seed)
+    # Each bird steers for its own offset from the newest gap, so deaths are spread over pipes, floor and ceiling
+    aim = np.random.default_rng(seed).normal(0, 25, n_players)
+
+    while not game.all_dead():
+        gap = vector.pipe_y[-1] - vector.pipe_opening[-1] / 2
+        jumps = (vector.y > gap + aim) & (vector.dy > 0)
+        for bird, jump in zip(game.birds, jumps):
+            bird.jumping = bool(jump)
+        vector.act(jumps[:, None].astype(float))
+        game.update()
+        vector.update()
+
+        assert [bird.dead for bird in game.birds] == vector.dead.tolist()
+        assert [bird.dead_time for bird in game.birds] == vector.dead_time.tolist()
+    assert vector.all_dead()